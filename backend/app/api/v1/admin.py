@@ -2,49 +2,93 @@
 Routes API Admin - Dashboard, statistiques, gestion utilisateurs
 Acces restreint au role ChatbotAdmin
 """
+import asyncio
+import csv
+import io
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import APIRouter, Depends, Query
+import msgspec
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-import io
-import csv
+
+from redis.asyncio import Redis
 
 from app.core.auth import get_current_user, require_admin, User
+from app.core.config import settings
+from app.core.redis import get_redis, get_redis_binary
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+# Les historiques de conversation sont des listes Redis d'elements msgpack
+_msg_dec = msgspec.msgpack.Decoder()
 
-@router.get("/stats")
-async def get_stats(admin: User = Depends(require_admin)):
-      """Retourne les statistiques globales pour le dashboard admin."""
-      import redis as redis_lib
-      from app.core.config import settings
-
-    r = redis_lib.from_url(settings.REDIS_URL, decode_responses=True)
+# Cache du payload /admin/stats (TTL court : le dashboard tolere 30s de retard)
+STATS_CACHE_KEY = "stats:dashboard:cache"
+STATS_CACHE_TTL = 30
 
-    queries_raw = r.lrange("stats:queries", 0, 999)
-    queries = [json.loads(q) for q in queries_raw]
+# Single-flight : une seule reconstruction des stats a la fois par process,
+# les autres requetes concurrentes attendent puis relisent le cache
+_stats_lock = asyncio.Lock()
 
-    total_queries = int(r.get("stats:total_queries") or 0)
-    now = time.time()
-    today_queries = [q for q in queries if now - q.get("timestamp", 0) < 86400]
-    week_queries = [q for q in queries if now - q.get("timestamp", 0) < 604800]
+# Reindexation : un seul worker dedie, jamais deux reindexations en parallele
+# (et on ne monopolise pas le thread-pool partage de asyncio.to_thread)
+_reindex_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reindex")
+_reindex_future: Optional[asyncio.Future] = None
 
-    from collections import Counter
-    top_questions = Counter([q.get("question", "")[:100] for q in queries]).most_common(20)
 
-    all_sources = []
-    for q in queries:
-              for s in q.get("sources", []):
-                            if isinstance(s, dict):
-                                              all_sources.append(s.get("file", ""))
-                                  top_sources = Counter(filter(None, all_sources)).most_common(10)
+@router.get("/stats")
+async def get_stats(admin: User = Depends(require_admin)):
+    """Retourne les statistiques globales pour le dashboard admin."""
+    r = get_redis()
+
+    # Le dashboard se rafraichit en boucle : on sert un agrega cache (TTL court)
+    # plutot que de re-parser ~2000 entrees JSON a chaque hit.
+    cached = await r.get(STATS_CACHE_KEY)
+    if cached:
+        return json.loads(cached)
+
+    async with _stats_lock:
+        # Double verification : le gagnant du lock a pu remplir le cache
+        # pendant qu'on attendait
+        cached = await r.get(STATS_CACHE_KEY)
+        if cached:
+            return json.loads(cached)
+        return await _build_stats(r)
+
+
+async def _build_stats(r: Redis) -> dict:
+    """Reconstruit le payload stats complet et le met en cache."""
+    queries_raw = await r.lrange("stats:queries", 0, 999)
+    queries = [json.loads(q) for q in queries_raw]
 
-          confidence_dist = Counter(q.get("confidence", "unknown") for q in queries)
+    total_queries = int(await r.get("stats:total_queries") or 0)
+
+    # Agregats precomputes a l'ecriture (StatsService.track) : plus de scan
+    # Python des 1000 dernieres requetes pour les compteurs jour/semaine.
+    days = [(datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(29, -1, -1)]
+    day_counts_raw = await r.mget([f"stats:queries:by_day:{d}" for d in days])
+    day_counts = [int(c or 0) for c in day_counts_raw]
+    daily_activity = [{"date": d, "queries": c} for d, c in zip(days, day_counts)]
+    queries_today = day_counts[-1]
+    queries_week = sum(day_counts[-7:])
+
+    # Top-K directement depuis les sorted sets Redis : O(K log N) cote
+    # serveur, aucun tri complet cote Python
+    top_questions_raw, top_sources_raw, confidence_hash = await asyncio.gather(
+        r.zrevrange("stats:zset:questions", 0, 19, withscores=True),
+        r.zrevrange("stats:zset:sources", 0, 9, withscores=True),
+        r.hgetall("stats:confidence"),
+    )
+    top_questions = [(q, int(score)) for q, score in top_questions_raw]
+    top_sources = [(s, int(score)) for s, score in top_sources_raw]
+    confidence_dist = {k: int(v) for k, v in confidence_hash.items()}
 
-    feedbacks_raw = r.lrange("stats:feedbacks", 0, 999)
+    feedbacks_raw = await r.lrange("stats:feedbacks", 0, 999)
     feedbacks = [json.loads(f) for f in feedbacks_raw]
     positive = sum(1 for f in feedbacks if f.get("feedback") == "positive")
     negative = sum(1 for f in feedbacks if f.get("feedback") == "negative")
@@ -54,212 +98,266 @@ async def get_stats(admin: User = Depends(require_admin)):
     response_times = [q.get("response_time_ms", 0) for q in queries if q.get("response_time_ms")]
     avg_response_time = round(sum(response_times) / len(response_times), 0) if response_times else 0
 
-    daily_activity = _compute_daily_activity(queries)
-
-    return {
-              "total_queries": total_queries,
-              "queries_today": len(today_queries),
-              "queries_week": len(week_queries),
-              "avg_response_time_ms": avg_response_time,
-              "satisfaction_rate": satisfaction_rate,
-              "positive_feedback": positive,
-              "negative_feedback": negative,
-              "top_questions": top_questions,
-              "top_sources": top_sources,
-              "confidence_distribution": dict(confidence_dist),
-              "daily_activity": daily_activity,
+    result = {
+        "total_queries": total_queries,
+        "queries_today": queries_today,
+        "queries_week": queries_week,
+        "avg_response_time_ms": avg_response_time,
+        "satisfaction_rate": satisfaction_rate,
+        "positive_feedback": positive,
+        "negative_feedback": negative,
+        "top_questions": top_questions,
+        "top_sources": top_sources,
+        "confidence_distribution": confidence_dist,
+        "daily_activity": daily_activity,
     }
 
+    await r.set(STATS_CACHE_KEY, json.dumps(result), ex=STATS_CACHE_TTL)
+    return result
+
 
 @router.get("/conversations")
 async def list_all_conversations(
-      page: int = Query(1, ge=1),
-      per_page: int = Query(50, ge=1, le=200),
-      user_filter: Optional[str] = None,
-      admin: User = Depends(require_admin)
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=200),
+    user_filter: Optional[str] = None,
+    admin: User = Depends(require_admin)
 ):
-      """Liste toutes les conversations de tous les utilisateurs."""
-      import redis as redis_lib
-      from app.core.config import settings
-
-    r = redis_lib.from_url(settings.REDIS_URL, decode_responses=True)
-    pattern = f"conv:*"
-    keys = r.keys(pattern)
+    """Liste toutes les conversations de tous les utilisateurs."""
+    r = get_redis()
+    # Ordre anti-chronologique directement depuis l'index d'activite ;
+    # repli sur un SCAN incremental si l'index n'est pas encore peuple
+    conv_index = await r.zrevrange("conv:by_activity", 0, -1)
+    if conv_index:
+        keys = [f"conv:{conv_id}" for conv_id in conv_index]
+    else:
+        keys = [k async for k in r.scan_iter(match="conv:*", count=500)]
 
     conversations = []
-    for key in keys:
-              data = r.get(key)
-              if data:
-                            try:
-                                              history = json.loads(data)
-                                              conv_id = key.replace("conv:", "")
-                                              if history:
-                                                                    conv_meta = r.get(f"conv_meta:{conv_id}")
-                                                                    meta = json.loads(conv_meta) if conv_meta else {}
-                                                                    user_id = meta.get("user_id", "unknown")
-
-                                                  if user_filter and user_filter.lower() not in user_id.lower():
-                                                                            continue
-
-                                                  conversations.append({
-                                                      "conversation_id": conv_id,
-                                                      "user_id": user_id,
-                                                      "message_count": len(history),
-                                                      "last_message": history[-1].get("question", "")[:100] if history else "",
-                                                      "started_at": meta.get("started_at", ""),
-                                                      "last_activity": meta.get("last_activity", ""),
-                                              })
-except Exception:
+    if keys:
+        # Metadonnees (client texte) et longueur + dernier echange (client
+        # binaire, l'historique est du msgpack) en deux pipelines paralleles ;
+        # seul le dernier element de chaque liste est rapatrie.
+        conv_ids = [key.replace("conv:", "") for key in keys]
+        rb = get_redis_binary()
+        meta_pipe = r.pipeline(transaction=False)
+        hist_pipe = rb.pipeline(transaction=False)
+        for conv_id in conv_ids:
+            meta_pipe.hgetall(f"conv_meta:{conv_id}")
+            hist_pipe.llen(f"conv:{conv_id}")
+            hist_pipe.lindex(f"conv:{conv_id}", -1)
+        metas, hists = await asyncio.gather(meta_pipe.execute(), hist_pipe.execute())
+
+        for i, (conv_id, meta) in enumerate(zip(conv_ids, metas)):
+            count = hists[2 * i]
+            last = hists[2 * i + 1]
+            if not last:
+                continue
+            try:
+                last_msg = _msg_dec.decode(last)
+                meta = meta or {}
+                user_id = meta.get("user_id", "unknown")
+
+                if user_filter and user_filter.lower() not in user_id.lower():
+                    continue
+
+                conversations.append({
+                    "conversation_id": conv_id,
+                    "user_id": user_id,
+                    "message_count": count,
+                    "last_message": last_msg.get("question", "")[:100],
+                    "started_at": meta.get("started_at", ""),
+                    "last_activity": meta.get("last_activity", ""),
+                })
+            except Exception:
                 continue
 
-    conversations.sort(key=lambda x: x.get("last_activity", ""), reverse=True)
+    if not conv_index:
+        conversations.sort(key=lambda x: x.get("last_activity", ""), reverse=True)
     total = len(conversations)
     start = (page - 1) * per_page
     end = start + per_page
 
     return {
-              "total": total,
-              "page": page,
-              "per_page": per_page,
-              "conversations": conversations[start:end]
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "conversations": conversations[start:end]
     }
 
 
 @router.get("/conversations/{conversation_id}")
 async def get_conversation_detail(
-      conversation_id: str,
-      admin: User = Depends(require_admin)
+    conversation_id: str,
+    admin: User = Depends(require_admin)
 ):
-      """Recupere le detail complet d'une conversation (admin)."""
-      import redis as redis_lib
-      from app.core.config import settings
-
-    r = redis_lib.from_url(settings.REDIS_URL, decode_responses=True)
-    data = r.get(f"conv:{conversation_id}")
-    if not data:
-              from fastapi import HTTPException
-              raise HTTPException(status_code=404, detail="Conversation non trouvee")
+    """Recupere le detail complet d'une conversation (admin)."""
+    r = get_redis()
+    # Historique (liste msgpack, client binaire) + metadonnees en parallele
+    history_raw, meta = await asyncio.gather(
+        get_redis_binary().lrange(f"conv:{conversation_id}", 0, -1),
+        r.hgetall(f"conv_meta:{conversation_id}"),
+    )
+    if not history_raw:
+        raise HTTPException(status_code=404, detail="Conversation non trouvee")
 
-    history = json.loads(data)
-    meta_data = r.get(f"conv_meta:{conversation_id}")
-    meta = json.loads(meta_data) if meta_data else {}
+    history = [_msg_dec.decode(item) for item in history_raw]
 
     return {
-              "conversation_id": conversation_id,
-              "user_id": meta.get("user_id", "unknown"),
-              "started_at": meta.get("started_at", ""),
-              "last_activity": meta.get("last_activity", ""),
-              "messages": history,
+        "conversation_id": conversation_id,
+        "user_id": meta.get("user_id", "unknown"),
+        "started_at": meta.get("started_at", ""),
+        "last_activity": meta.get("last_activity", ""),
+        "messages": history,
     }
 
 
 @router.get("/users")
 async def list_users(admin: User = Depends(require_admin)):
-      """Liste les utilisateurs avec leurs statistiques."""
-      import redis as redis_lib
-      from app.core.config import settings
-
-    r = redis_lib.from_url(settings.REDIS_URL, decode_responses=True)
-    user_keys = r.keys("stats:user:*:query_count")
+    """Liste les utilisateurs avec leurs statistiques."""
+    r = get_redis()
+    user_keys = [k async for k in r.scan_iter(match="stats:user:*:query_count", count=500)]
 
     users = []
-    for key in user_keys:
-              user_id = key.split(":")[2]
-              query_count = int(r.get(key) or 0)
-              users.append({
-                  "user_id": user_id,
-                  "query_count": query_count,
-              })
+    if user_keys:
+        counts = await r.mget(user_keys)
+        for key, count in zip(user_keys, counts):
+            users.append({
+                "user_id": key.split(":")[2],
+                "query_count": int(count or 0),
+            })
 
     users.sort(key=lambda x: x["query_count"], reverse=True)
     return {"total": len(users), "users": users}
 
 
+EXPORT_FIELDS = ["conversation_id", "user_id", "question", "answer", "sources", "confidence"]
+
+
+async def _scan_batches(r: Redis, pattern: str, size: int = 200):
+    """Itere les cles par lots bornes pour alimenter des MGET groupes."""
+    batch: list = []
+    async for key in r.scan_iter(match=pattern, count=500):
+        batch.append(key)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _export_rows(r: Redis, keys: list):
+    """Genere les lignes d'export pour un lot de cles conv:*."""
+    conv_ids = [key.replace("conv:", "") for key in keys]
+    meta_pipe = r.pipeline(transaction=False)
+    hist_pipe = get_redis_binary().pipeline(transaction=False)
+    for conv_id in conv_ids:
+        meta_pipe.hgetall(f"conv_meta:{conv_id}")
+        hist_pipe.lrange(f"conv:{conv_id}", 0, -1)
+    metas, convs = await asyncio.gather(meta_pipe.execute(), hist_pipe.execute())
+
+    for conv_id, items, meta in zip(conv_ids, convs, metas):
+        if not items:
+            continue
+        try:
+            history = [_msg_dec.decode(item) for item in items]
+            meta = meta or {}
+        except Exception:
+            continue
+        for msg in history:
+            yield {
+                "conversation_id": conv_id,
+                "user_id": meta.get("user_id", ""),
+                "question": msg.get("question", ""),
+                "answer": msg.get("answer", "")[:500],
+                "sources": ", ".join([s.get("file", "") for s in msg.get("sources", [])]),
+                "confidence": msg.get("confidence", ""),
+            }
+
+
+def _drain(buffer: io.StringIO) -> str:
+    """Vide le buffer CSV et retourne son contenu."""
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return chunk
+
+
 @router.get("/export/conversations")
 async def export_conversations(
-      format: str = Query("csv", regex="^(csv|json)$"),
-      admin: User = Depends(require_admin)
+    format: str = Query("csv", regex="^(csv|json)$"),
+    limit: int = Query(10000, ge=1, le=100000),
+    since_days: int = Query(30, ge=1, le=365),
+    admin: User = Depends(require_admin)
 ):
-      """Exporte toutes les conversations en CSV ou JSON."""
-      import redis as redis_lib
-      from app.core.config import settings
-
-    r = redis_lib.from_url(settings.REDIS_URL, decode_responses=True)
-    keys = r.keys("conv:*")
-
-    all_data = []
-    for key in keys:
-              data = r.get(key)
-              if data:
-                            try:
-                                              history = json.loads(data)
-                                              conv_id = key.replace("conv:", "")
-                                              meta_data = r.get(f"conv_meta:{conv_id}")
-                                              meta = json.loads(meta_data) if meta_data else {}
-                                              for msg in history:
-                                                                    all_data.append({
-                                                                                              "conversation_id": conv_id,
-                                                                                              "user_id": meta.get("user_id", ""),
-                                                                                              "question": msg.get("question", ""),
-                                                                                              "answer": msg.get("answer", "")[:500],
-                                                                                              "sources": ", ".join([s.get("file", "") for s in msg.get("sources", [])]),
-                                                                                              "confidence": msg.get("confidence", ""),
-                                                                    })
-                            except Exception:
-                                              continue
-
-                    if format == "json":
-                              return all_data
-
-    output = io.StringIO()
-    if all_data:
-              writer = csv.DictWriter(output, fieldnames=all_data[0].keys())
+    """
+    Exporte les conversations en CSV ou JSON.
+    Borne par defaut aux 30 derniers jours et 10000 conversations via
+    l'index conv:by_activity ; streame lot par lot, memoire bornee.
+    """
+    r = get_redis()
+
+    since_ts = time.time() - since_days * 86400
+    conv_ids = await r.zrangebyscore("conv:by_activity", since_ts, "+inf", start=0, num=limit)
+
+    async def iter_batches():
+        if conv_ids:
+            for i in range(0, len(conv_ids), 200):
+                yield [f"conv:{cid}" for cid in conv_ids[i:i + 200]]
+        else:
+            # Index pas encore peuple : scan complet (non borne)
+            async for batch in _scan_batches(r, "conv:*"):
+                yield batch
+
+    async def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
         writer.writeheader()
-        writer.writerows(all_data)
+        yield _drain(buffer)
+        async for batch in iter_batches():
+            async for row in _export_rows(r, batch):
+                writer.writerow(row)
+            yield _drain(buffer)
+
+    async def generate_json():
+        yield "["
+        first = True
+        async for batch in iter_batches():
+            async for row in _export_rows(r, batch):
+                prefix = "" if first else ","
+                first = False
+                yield prefix + json.dumps(row, ensure_ascii=False)
+        yield "]"
+
+    if format == "json":
+        return StreamingResponse(generate_json(), media_type="application/json")
 
     return StreamingResponse(
-              iter([output.getvalue()]),
-              media_type="text/csv",
-              headers={"Content-Disposition": "attachment; filename=conversations.csv"}
+        generate_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=conversations.csv"}
     )
 
 
 @router.post("/reindex")
 async def trigger_reindex(
-      full: bool = False,
-      admin: User = Depends(require_admin)
+    full: bool = False,
+    admin: User = Depends(require_admin)
 ):
-      """Declenche une reindexation des documents en arriere-plan."""
-    from fastapi.background import BackgroundTasks
+    """Declenche une reindexation des documents en arriere-plan."""
+    global _reindex_future
+    if _reindex_future is not None and not _reindex_future.done():
+        return {"status": "already_running", "full": full}
+
+    # Import differe volontairement : le module tire unstructured et
+    # watchdog, absents de l'image API - seul cet endpoint en depend
     from ingestion.pipeline import IngestionPipeline
 
     pipeline = IngestionPipeline()
     if full:
-              import redis as redis_lib
-        from app.core.config import settings
-        r = redis_lib.from_url(settings.REDIS_URL)
-        r.delete("ingestion:tracker")
+        r = get_redis()
+        await r.delete("ingestion:tracker")
 
-    import asyncio
-    asyncio.create_task(asyncio.to_thread(pipeline.process_all))
+    loop = asyncio.get_running_loop()
+    _reindex_future = loop.run_in_executor(_reindex_executor, pipeline.process_all)
     return {"status": "reindex_started", "full": full}
-
-
-def _compute_daily_activity(queries: list) -> list:
-      """Calcule l'activite quotidienne sur les 30 derniers jours."""
-    from datetime import datetime, timedelta
-    from collections import defaultdict
-
-    daily = defaultdict(int)
-    for q in queries:
-              ts = q.get("timestamp", 0)
-        if ts:
-                      date_str = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-                      daily[date_str] += 1
-
-    result = []
-    for i in range(29, -1, -1):
-              date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        result.append({"date": date, "queries": daily.get(date, 0)})
-
-    return result
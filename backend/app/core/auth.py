@@ -2,12 +2,16 @@
 Authentification SSO via Keycloak (JWT / OIDC)
 Gestion des roles : ChatbotUser, ChatbotAdmin, ChatbotPower
 """
+import asyncio
+import hashlib
+import time
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Optional, Tuple
 
 import httpx
 import jwt
-from fastapi import Depends, HTTPException, status
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jwt import PyJWKClient
 import structlog
@@ -19,119 +23,223 @@ security = HTTPBearer(auto_error=False)
 
 _jwks_client: Optional[PyJWKClient] = None
 
+# Cache des payloads JWT deja verifies : le meme bearer token revient des
+# milliers de fois pendant sa duree de vie, inutile de re-verifier la
+# signature RS256 (~1-2 ms CPU) a chaque requete. Cle = sha256 du token,
+# TTL court et borne par l'expiration du token lui-meme.
+_PAYLOAD_CACHE_TTL = 30
+_payload_cache: TTLCache = TTLCache(maxsize=10000, ttl=_PAYLOAD_CACHE_TTL)
+
+# Cle publique RSA materialisee par kid : evite la reconstruction
+# JWK -> objet cryptography a chaque verification
+_kid_to_key: dict = {}
+
+# Arguments de jwt.decode partages entre tous les appels : pas de
+# re-allocation de la liste d'algorithmes ni du dict d'options
+_ALGS = ("RS256",)
+_DECODE_OPTS = {"verify_exp": True}
+
+# Roles acceptes par require_power_user
+_POWER_ROLES = frozenset({"ChatbotPower", "ChatbotAdmin"})
+
 
 def get_jwks_client() -> PyJWKClient:
-      """Retourne le client JWKS (cached)."""
-      global _jwks_client
-      if _jwks_client is None:
-                _jwks_client = PyJWKClient(settings.get_jwks_uri())
-            return _jwks_client
+    """Retourne le client JWKS (cached)."""
+    global _jwks_client
+    if _jwks_client is None:
+        # Cache JWK integre de PyJWT : pas de GET HTTPS vers Keycloak par
+        # kid inconnu ; la rotation de cles est prise en compte au plus
+        # tard apres `lifespan` secondes
+        _jwks_client = PyJWKClient(
+            settings.jwks_uri,
+            cache_keys=True,
+            cache_jwk_set=True,
+            lifespan=3600,
+            max_cached_keys=16,
+        )
+    return _jwks_client
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class User:
-      """Modele utilisateur extrait du token JWT."""
+    """
+    Modele utilisateur extrait du token JWT.
+
+    slots + frozen : pas de __dict__ par instance (un User est construit a
+    chaque requete authentifiee), acces attributs plus rapide, et l'objet
+    immuable est hashable.
+    """
     id: str
     email: str
     name: str
-    roles: List[str] = field(default_factory=list)
+    roles: Tuple[str, ...] = field(default_factory=tuple)
     department: str = ""
     preferred_username: str = ""
+    # Vue frozenset des roles, calculee une fois : appartenance O(1)
+    _roles_set: frozenset = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # object.__setattr__ car la dataclass est frozen
+        object.__setattr__(self, "_roles_set", frozenset(self.roles))
 
     def is_admin(self) -> bool:
-              return "ChatbotAdmin" in self.roles
+        return "ChatbotAdmin" in self._roles_set
 
     def is_power_user(self) -> bool:
-              return "ChatbotPower" in self.roles or self.is_admin()
-
-
-async def get_current_user(
-      credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+        return "ChatbotPower" in self._roles_set or self.is_admin()
+
+
+def _user_from_payload(payload: dict) -> User:
+    """Construit le modele User depuis un payload JWT verifie."""
+    resource_access = payload.get("resource_access", {})
+    client_roles = resource_access.get(settings.KEYCLOAK_CLIENT_ID, {}).get("roles", [])
+    realm_roles = payload.get("realm_access", {}).get("roles", [])
+    # dict.fromkeys deduplique en conservant l'ordre, sans set intermediaire
+    all_roles = tuple(dict.fromkeys((*client_roles, *realm_roles)))
+
+    return User(
+        id=payload.get("sub", ""),
+        email=payload.get("email", ""),
+        name=payload.get("name", payload.get("preferred_username", "")),
+        preferred_username=payload.get("preferred_username", ""),
+        roles=all_roles,
+        department=payload.get("department", ""),
+    )
+
+
+# Utilisateur de test unique pour le mode developpement
+_MOCK_USER = User(
+    id="test-user-id",
+    email="test@example.com",
+    name="Test User",
+    roles=("ChatbotUser", "ChatbotAdmin"),
+    department="technique"
+)
+
+
+async def _mock_current_user(request: Request) -> User:
+    """Mode mock : utilisateur fige, aucun parsing du header Authorization."""
+    request.state.user = _MOCK_USER
+    return _MOCK_USER
+
+
+async def _authenticate_request(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
 ) -> User:
-      """
-          Valide le token JWT Keycloak et retourne l'utilisateur connecte.
-              En mode developpement (LLM_PROVIDER=mock), retourne un utilisateur de test.
-                  """
-    if settings.LLM_PROVIDER == "mock":
-              return User(
-                            id="test-user-id",
-                            email="test@example.com",
-                            name="Test User",
-                            roles=["ChatbotUser", "ChatbotAdmin"],
-                            department="technique"
-              )
-
+    """
+    Valide le token JWT Keycloak et retourne l'utilisateur connecte.
+
+    FastAPI memorise le resultat par requete (use_cache=True par defaut) :
+    require_admin / require_power_user composes via Depends ne re-decodent
+    jamais le token. L'utilisateur est aussi depose dans request.state pour
+    les consommateurs hors graphe de dependances.
+    """
     if not credentials:
-              raise HTTPException(
-                            status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail="Token d'authentification manquant",
-                            headers={"WWW-Authenticate": "Bearer"},
-              )
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token d'authentification manquant",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
     token = credentials.credentials
 
+    # Chemin chaud : token deja verifie recemment, simple lookup dict
+    token_hash = hashlib.sha256(token.encode()).hexdigest()[:32]
+    payload = _payload_cache.get(token_hash)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        user = _user_from_payload(payload)
+        request.state.user = user
+        return user
+
     try:
-              jwks_client = get_jwks_client()
-              signing_key = jwks_client.get_signing_key_from_jwt(token)
-
-        payload = jwt.decode(
-                      token,
-                      signing_key.key,
-                      algorithms=["RS256"],
-                      audience=settings.KEYCLOAK_CLIENT_ID,
-                      options={"verify_exp": True},
+        # Cle deja materialisee pour ce kid ? Sinon, la resolution JWKS
+        # (et un eventuel fetch HTTP) est bloquante : on la sort de la
+        # boucle d'evenements
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = _kid_to_key.get(kid)
+        if key is None:
+            jwks_client = get_jwks_client()
+            signing_key = await asyncio.to_thread(
+                jwks_client.get_signing_key_from_jwt, token
+            )
+            key = signing_key.key
+            if kid:
+                if len(_kid_to_key) > 32:
+                    _kid_to_key.clear()
+                _kid_to_key[kid] = key
+
+        payload = await asyncio.to_thread(
+            jwt.decode,
+            token,
+            key,
+            algorithms=_ALGS,
+            audience=settings.KEYCLOAK_CLIENT_ID,
+            options=_DECODE_OPTS,
         )
 
-        resource_access = payload.get("resource_access", {})
-        client_roles = resource_access.get(settings.KEYCLOAK_CLIENT_ID, {}).get("roles", [])
-        realm_roles = payload.get("realm_access", {}).get("roles", [])
-        all_roles = list(set(client_roles + realm_roles))
-
-        return User(
-                      id=payload.get("sub", ""),
-                      email=payload.get("email", ""),
-                      name=payload.get("name", payload.get("preferred_username", "")),
-                      preferred_username=payload.get("preferred_username", ""),
-                      roles=all_roles,
-                      department=payload.get("department", ""),
-        )
+        # On ne cache jamais au-dela de l'expiration du token
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            _payload_cache[token_hash] = payload
+
+        user = _user_from_payload(payload)
+        request.state.user = user
+        return user
 
-except jwt.ExpiredSignatureError:
+    except jwt.ExpiredSignatureError:
         raise HTTPException(
-                      status_code=status.HTTP_401_UNAUTHORIZED,
-                      detail="Token expire",
-                      headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token expire",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-except jwt.InvalidTokenError as e:
+    except jwt.InvalidTokenError as e:
         logger.warning("Token JWT invalide", error=str(e))
         raise HTTPException(
-                      status_code=status.HTTP_401_UNAUTHORIZED,
-                      detail="Token invalide",
-                      headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-except Exception as e:
+    except Exception as e:
         logger.error("Erreur d'authentification", error=str(e))
         raise HTTPException(
-                      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                      detail="Erreur d'authentification",
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erreur d'authentification",
         )
 
 
+# La branche est choisie une fois au chargement du module : en mode mock la
+# dependance HTTPBearer n'est jamais cablee, le header n'est jamais parse
+if settings.LLM_PROVIDER == "mock":
+    get_current_user = _mock_current_user
+else:
+    get_current_user = _authenticate_request
+
+
+async def current_user_from_state(request: Request) -> User:
+    """
+    Dependance legere : relit l'utilisateur deja valide dans request.state.
+    A reserver aux composants traverses apres get_current_user (middlewares,
+    sous-dependances) qui n'ont pas besoin de re-valider le token.
+    """
+    return request.state.user
+
+
 async def require_admin(user: User = Depends(get_current_user)) -> User:
-      """Dependance FastAPI - exige le role ChatbotAdmin."""
-    if not user.is_admin():
-              raise HTTPException(
-                            status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Acces administrateur requis",
-              )
-          return user
+    """Dependance FastAPI - exige le role ChatbotAdmin."""
+    if "ChatbotAdmin" not in user._roles_set:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acces administrateur requis",
+        )
+    return user
 
 
 async def require_power_user(user: User = Depends(get_current_user)) -> User:
-      """Dependance FastAPI - exige le role ChatbotPower ou ChatbotAdmin."""
-    if not user.is_power_user():
-              raise HTTPException(
-                            status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Acces utilisateur avance requis",
-              )
-          return user
+    """Dependance FastAPI - exige le role ChatbotPower ou ChatbotAdmin."""
+    if user._roles_set.isdisjoint(_POWER_ROLES):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acces utilisateur avance requis",
+        )
+    return user
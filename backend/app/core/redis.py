@@ -0,0 +1,58 @@
+"""
+Client Redis partage - un seul pool de connexions par process
+"""
+from functools import lru_cache
+
+from redis.asyncio import ConnectionPool, Redis
+
+from app.core.config import settings
+
+
+@lru_cache()
+def get_redis_pool() -> ConnectionPool:
+    """
+    Pool de connexions Redis unique, partage par tous les handlers.
+
+    REDIS_URL accepte aussi un socket unix (unix:///var/run/redis/redis.sock)
+    quand Redis est co-localise avec le backend : on contourne la pile TCP
+    loopback et la latence par commande chute sensiblement.
+    """
+    kwargs = dict(
+        decode_responses=True,
+        max_connections=100,
+        health_check_interval=30,
+        retry_on_timeout=True,
+        client_name="rag-backend",
+    )
+    # socket_keepalive n'existe que pour les connexions TCP
+    if not settings.REDIS_URL.startswith("unix://"):
+        kwargs["socket_keepalive"] = True
+    return ConnectionPool.from_url(settings.REDIS_URL, **kwargs)
+
+
+def get_redis() -> Redis:
+    """Retourne un client Redis adosse au pool partage."""
+    return Redis(connection_pool=get_redis_pool())
+
+
+@lru_cache()
+def get_redis_binary_pool() -> ConnectionPool:
+    """
+    Pool binaire (decode_responses=False), pour les valeurs qui ne sont pas
+    du texte UTF-8 (historiques msgpack, vecteurs float32).
+    """
+    kwargs = dict(
+        decode_responses=False,
+        max_connections=100,
+        health_check_interval=30,
+        retry_on_timeout=True,
+        client_name="rag-backend-bin",
+    )
+    if not settings.REDIS_URL.startswith("unix://"):
+        kwargs["socket_keepalive"] = True
+    return ConnectionPool.from_url(settings.REDIS_URL, **kwargs)
+
+
+def get_redis_binary() -> Redis:
+    """Retourne un client Redis binaire adosse au pool partage."""
+    return Redis(connection_pool=get_redis_binary_pool())
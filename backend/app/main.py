@@ -2,14 +2,28 @@
 RAG Expert Chatbot - Backend FastAPI
 Point d'entree principal de l'application
 """
+import asyncio
+from contextlib import asynccontextmanager
+
+# Boucle d'evenements uvloop si disponible (no-op sous uvicorn --loop uvloop,
+# protege les lancements directs)
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
-from contextlib import asynccontextmanager
 import structlog
 
 from app.core.config import settings
+from app.core.auth import get_jwks_client
+from app.mcp.sharepoint_mcp_client import get_sharepoint_mcp_client
+from app.services.cache_service import get_cache_service
 from app.core.database import engine, Base
 from app.api.v1.router import api_router
 from app.api.webhooks import webhooks_router
@@ -19,31 +33,72 @@ logger = structlog.get_logger()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-      """Gestion du cycle de vie de l'application."""
-      logger.info("Demarrage de RAG Expert Chatbot", version="1.0.0")
-      async with engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-            logger.info("Base de donnees initialisee")
+    """Gestion du cycle de vie de l'application."""
+    logger.info("Demarrage de RAG Expert Chatbot", version="1.0.0")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    logger.info("Base de donnees initialisee")
+
+    # Pre-chauffe du cache JWKS : la premiere requete authentifiee ne paie
+    # pas le fetch HTTPS vers Keycloak
+    if settings.LLM_PROVIDER != "mock":
+        try:
+            await asyncio.to_thread(get_jwks_client().fetch_data)
+            logger.info("Cache JWKS initialise")
+        except Exception as e:
+            logger.warning("Pre-chauffe JWKS impossible", error=str(e))
+
+    # Pool Redis chauffe au boot : la premiere requete utilisateur ne
+    # paie ni le handshake TCP ni le ping de verification
+    if await get_cache_service().health_check():
+        logger.info("Cache Redis initialise")
+    else:
+        logger.warning("Cache Redis injoignable au demarrage")
+
+    # Session MCP SharePoint pre-chauffee : la premiere requete ne paie
+    # pas le handshake stdio
+    sharepoint_client = None
+    if settings.SHAREPOINT_ENABLED:
+        sharepoint_client = get_sharepoint_mcp_client()
+        try:
+            await sharepoint_client.start()
+            logger.info("Client MCP SharePoint initialise")
+        except Exception as e:
+            logger.warning("Demarrage MCP SharePoint impossible", error=str(e))
+
     yield
+
+    if sharepoint_client is not None:
+        await sharepoint_client.close()
     logger.info("Arret de l'application")
 
 
 app = FastAPI(
-      title="RAG Expert Chatbot API",
-      description="API REST pour le chatbot RAG expert metiers",
-      version="1.0.0",
-      docs_url="/api/docs",
-      redoc_url="/api/redoc",
-      openapi_url="/api/openapi.json",
-      lifespan=lifespan,
+    title="RAG Expert Chatbot API",
+    description="API REST pour le chatbot RAG expert metiers",
+    version="1.0.0",
+    docs_url="/api/docs",
+    redoc_url="/api/redoc",
+    openapi_url="/api/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
+# Reponses fixes pre-serialisees : les probes de liveness tapent /health
+# en continu, inutile de re-encoder le meme dict a chaque hit
+_HEALTH = ORJSONResponse({"status": "ok", "version": "1.0.0"})
+_ROOT = ORJSONResponse({
+    "message": "RAG Expert Chatbot API",
+    "docs": "/api/docs",
+    "version": "1.0.0"
+})
+
 app.add_middleware(
-      CORSMiddleware,
-      allow_origins=settings.CORS_ORIGINS.split(","),
-      allow_credentials=True,
-      allow_methods=["*"],
-      allow_headers=["*"],
+    CORSMiddleware,
+    allow_origins=list(settings.cors_origins_list),
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
 )
 
 app.include_router(api_router, prefix="/api/v1")
@@ -52,13 +107,9 @@ app.include_router(webhooks_router, prefix="/api/v1/webhooks")
 
 @app.get("/health", tags=["health"])
 async def health_check():
-      return {"status": "ok", "version": "1.0.0"}
+    return _HEALTH
 
 
 @app.get("/", tags=["root"])
 async def root():
-      return {
-          "message": "RAG Expert Chatbot API",
-          "docs": "/api/docs",
-          "version": "1.0.0"
-}
+    return _ROOT
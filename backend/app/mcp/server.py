@@ -5,19 +5,29 @@ Expose le RAG comme source de connaissance pour Claude Desktop, Cursor, etc.
 Usage dans Claude Desktop (~/.config/claude/claude_desktop_config.json) :
 {
   "mcpServers": {
-      "rag-expert-metier": {
-            "command": "python",
-                  "args": ["-m", "app.mcp.server"],
-                        "cwd": "/chemin/vers/rag-expert-chatbot/backend"
+    "rag-expert-metier": {
+      "command": "python",
+      "args": ["-m", "app.mcp.server"],
+      "cwd": "/chemin/vers/rag-expert-chatbot/backend"
     }
-      }
-      }
-      """
+  }
+}
+"""
 import asyncio
-import json
+import atexit
+import functools
 import sqlite3
 from pathlib import Path
 
+# uvloop accelere sensiblement le streaming stdio (asyncio.run ci-dessous)
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+import orjson
+
 import mcp.types as types
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -27,235 +37,311 @@ from app.core.config import settings
 app = Server("rag-expert-metier")
 
 
+def _dumps(obj) -> str:
+    """Serialisation JSON compacte via orjson (les clients MCP parsent
+    mecaniquement, l'indentation n'est que du CPU perdu)."""
+    return orjson.dumps(obj).decode()
+
+_DB_PATH = Path("ingestion_tracker.db")
+
+# SQL en constantes de module : le cache d'instructions preparees de la
+# connexion (cached_statements) reutilise les arbres de parse
+_SQL_LIST_DOCS = (
+    "SELECT filepath, indexed_at, chunk_count, status "
+    "FROM indexed_files WHERE status = 'success'"
+)
+# Totaux calcules cote SQLite (UNION ALL sur la CTE) : un seul scan,
+# aucune re-sommation Python
+_SQL_STATS = (
+    "WITH g AS ("
+    "  SELECT status, COUNT(*) AS n, COALESCE(SUM(chunk_count), 0) AS s"
+    "  FROM indexed_files GROUP BY status"
+    ") "
+    "SELECT status, n, s FROM g "
+    "UNION ALL SELECT '__total__', SUM(n), SUM(s) FROM g"
+)
+_SQL_RESOURCE_INDEX = (
+    "SELECT filepath, indexed_at, chunk_count "
+    "FROM indexed_files WHERE status = 'success'"
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _tracker_conn() -> sqlite3.Connection:
+    """
+    Connexion sqlite unique en lecture seule, partagee par tous les handlers.
+
+    mode=ro&cache=shared : les appels outils partagent le page-cache SQLite
+    au lieu de payer open + warmup a chaque appel.
+    """
+    conn = sqlite3.connect(
+        f"file:{_DB_PATH}?mode=ro&cache=shared",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=128,
+    )
+    conn.execute("PRAGMA query_only=1")
+    conn.execute("PRAGMA mmap_size=67108864")
+    return conn
+
+
+def _list_docs_sync() -> list:
+    """Lit les documents indexes (bloquant, a appeler via to_thread)."""
+    return _tracker_conn().execute(_SQL_LIST_DOCS).fetchall()
+
+
+def _stats_sync() -> list:
+    """Lit les statistiques d'indexation (bloquant, a appeler via to_thread)."""
+    return _tracker_conn().execute(_SQL_STATS).fetchall()
+
+
+def _resource_index_sync() -> list:
+    """Lit l'index documentaire (bloquant, a appeler via to_thread)."""
+    return _tracker_conn().execute(_SQL_RESOURCE_INDEX).fetchall()
+
+
+@functools.lru_cache(maxsize=1)
 def get_rag_service():
-      """Lazy import pour eviter les imports circulaires."""
-      from app.services.rag_service import RAGService
-      return RAGService()
+    """
+    RAGService partage par tous les appels outils : clients Qdrant,
+    embeddings et provider LLM ne sont construits qu'une seule fois.
+    Lazy import pour eviter les imports circulaires.
+    """
+    from app.services.rag_service import RAGService
+    return RAGService()
+
+
+def _close_rag_service():
+    """Ferme proprement les clients partages a l'arret."""
+    if get_rag_service.cache_info().currsize:
+        from app.services.rag_service import close_clients
+        close_clients()
+
+
+atexit.register(_close_rag_service)
+
+
+# Declarations d'outils construites une seule fois a l'import : les schemas
+# sont identiques pour tous les clients, inutile de re-allouer les dicts
+# a chaque handshake
+_TOOLS = [
+    types.Tool(
+        name="rechercher_documentation",
+        description=(
+            "Recherche dans la documentation interne de l'entreprise. "
+            "Utilise la recherche semantique vectorielle pour trouver les passages pertinents. "
+            "Retourne les extraits les plus pertinents avec leurs sources."
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "La question ou le terme de recherche"
+                },
+                "departement": {
+                    "type": "string",
+                    "description": "Filtrer par departement (rh, finance, juridique, technique, commercial)",
+                    "enum": ["rh", "finance", "juridique", "technique", "commercial", "general"]
+                },
+                "nb_resultats": {
+                    "type": "integer",
+                    "description": "Nombre de resultats a retourner (defaut: 5)",
+                    "default": 5,
+                    "minimum": 1,
+                    "maximum": 20
+                }
+            },
+            "required": ["query"]
+        }
+    ),
+    types.Tool(
+        name="poser_question_expert",
+        description=(
+            "Pose une question a l'expert metier RAG. "
+            "Retourne une reponse complete basee sur la documentation interne, "
+            "avec les sources citees."
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "question": {
+                    "type": "string",
+                    "description": "La question a poser a l'expert"
+                },
+                "departement": {
+                    "type": "string",
+                    "description": "Contexte de departement pour la recherche"
+                }
+            },
+            "required": ["question"]
+        }
+    ),
+    types.Tool(
+        name="lister_documents",
+        description="Liste tous les documents indexes dans la base de connaissance avec leurs metadonnees.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "categorie": {
+                    "type": "string",
+                    "description": "Filtrer par categorie de document"
+                },
+                "recent_jours": {
+                    "type": "integer",
+                    "description": "Nombre de jours pour les documents recents (defaut: tous)",
+                    "default": 0
+                }
+            }
+        }
+    ),
+    types.Tool(
+        name="statistiques_base",
+        description="Retourne les statistiques de la base de connaissance (nombre de documents, chunks, etc.).",
+        inputSchema={
+            "type": "object",
+            "properties": {}
+        }
+    )
+]
 
 
 @app.list_tools()
 async def list_tools() -> list[types.Tool]:
-      """Liste tous les outils MCP disponibles."""
-      return [
-          types.Tool(
-              name="rechercher_documentation",
-              description=(
-                  "Recherche dans la documentation interne de l'entreprise. "
-                  "Utilise la recherche semantique vectorielle pour trouver les passages pertinents. "
-                  "Retourne les extraits les plus pertinents avec leurs sources."
-              ),
-              inputSchema={
-                  "type": "object",
-                  "properties": {
-                      "query": {
-                          "type": "string",
-                          "description": "La question ou le terme de recherche"
-                      },
-                      "departement": {
-                          "type": "string",
-                          "description": "Filtrer par departement (rh, finance, juridique, technique, commercial)",
-                          "enum": ["rh", "finance", "juridique", "technique", "commercial", "general"]
-                      },
-                      "nb_resultats": {
-                          "type": "integer",
-                          "description": "Nombre de resultats a retourner (defaut: 5)",
-                          "default": 5,
-                          "minimum": 1,
-                          "maximum": 20
-                      }
-                  },
-                  "required": ["query"]
-              }
-          ),
-          types.Tool(
-              name="poser_question_expert",
-              description=(
-                  "Pose une question a l'expert metier RAG. "
-                  "Retourne une reponse complete basee sur la documentation interne, "
-                  "avec les sources citees."
-              ),
-              inputSchema={
-                  "type": "object",
-                  "properties": {
-                      "question": {
-                          "type": "string",
-                          "description": "La question a poser a l'expert"
-                      },
-                      "departement": {
-                          "type": "string",
-                          "description": "Contexte de departement pour la recherche"
-                      }
-                  },
-                  "required": ["question"]
-              }
-          ),
-          types.Tool(
-              name="lister_documents",
-              description="Liste tous les documents indexes dans la base de connaissance avec leurs metadonnees.",
-              inputSchema={
-                  "type": "object",
-                  "properties": {
-                      "categorie": {
-                          "type": "string",
-                          "description": "Filtrer par categorie de document"
-                      },
-                      "recent_jours": {
-                          "type": "integer",
-                          "description": "Nombre de jours pour les documents recents (defaut: tous)",
-                          "default": 0
-                      }
-                  }
-              }
-          ),
-          types.Tool(
-              name="statistiques_base",
-              description="Retourne les statistiques de la base de connaissance (nombre de documents, chunks, etc.).",
-              inputSchema={
-                  "type": "object",
-                  "properties": {}
-              }
-          )
-      ]
+    """Liste tous les outils MCP disponibles."""
+    return _TOOLS
 
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
-      """Execute un outil MCP."""
+    """Execute un outil MCP."""
 
     if name == "rechercher_documentation":
-              rag = get_rag_service()
-              query = arguments["query"]
-              departement = arguments.get("departement")
-              nb_resultats = arguments.get("nb_resultats", 5)
+        rag = get_rag_service()
+        query = arguments["query"]
+        departement = arguments.get("departement")
+        nb_resultats = arguments.get("nb_resultats", 5)
 
         docs = await rag._retrieve_documents(query, departement)
         docs = docs[:nb_resultats]
 
         results = []
         for doc in docs:
-                      results.append({
-                                        "contenu": doc.page_content,
-                                        "source": doc.metadata.get("source_file", ""),
-                                        "chemin": doc.metadata.get("source_path", ""),
-                                        "categorie": doc.metadata.get("category", ""),
-                                        "departement": doc.metadata.get("department", ""),
-                      })
+            results.append({
+                "contenu": doc.page_content,
+                "source": doc.metadata.get("source_file", ""),
+                "chemin": doc.metadata.get("source_path", ""),
+                "categorie": doc.metadata.get("category", ""),
+                "departement": doc.metadata.get("department", ""),
+            })
 
         return [types.TextContent(
-                      type="text",
-                      text=json.dumps(results, ensure_ascii=False, indent=2)
+            type="text",
+            text=_dumps(results)
         )]
 
-elif name == "poser_question_expert":
+    elif name == "poser_question_expert":
         rag = get_rag_service()
         question = arguments["question"]
         departement = arguments.get("departement")
 
         result = await rag.chat(
-                      message=question,
-                      user_id="mcp-client",
-                      department_filter=departement
+            message=question,
+            user_id="mcp-client",
+            department_filter=departement
         )
 
         response_text = f"**Reponse :**\n{result['answer']}\n\n"
         if result.get("sources"):
-                      response_text += "**Sources :**\n"
-                      for source in result["sources"]:
-                                        response_text += f"- {source['file']}\n"
-                                response_text += f"\n*Confiance : {result.get('confidence', 'inconnue')}*"
+            response_text += "**Sources :**\n"
+            for source in result["sources"]:
+                response_text += f"- {source['file']}\n"
+            response_text += f"\n*Confiance : {result.get('confidence', 'inconnue')}*"
 
         return [types.TextContent(type="text", text=response_text)]
 
-elif name == "lister_documents":
-        db_path = Path("ingestion_tracker.db")
-        if not db_path.exists():
-                      return [types.TextContent(type="text", text="Base de donnees d'indexation non trouvee.")]
+    elif name == "lister_documents":
+        if not _DB_PATH.exists():
+            return [types.TextContent(type="text", text="Base de donnees d'indexation non trouvee.")]
 
-        conn = sqlite3.connect(str(db_path))
-        query = "SELECT filepath, indexed_at, chunk_count, status FROM indexed_files WHERE status = 'success'"
-        rows = conn.execute(query).fetchall()
-        conn.close()
+        # Scan sqlite hors boucle d'evenements : le pipe stdio reste reactif
+        rows = await asyncio.to_thread(_list_docs_sync)
 
         documents = [
-                      {
-                                        "fichier": Path(r[0]).name,
-                                        "indexe_le": r[1],
-                                        "chunks": r[2],
-                                        "statut": r[3]
-                      }
-                      for r in rows
+            {
+                "fichier": Path(r[0]).name,
+                "indexe_le": r[1],
+                "chunks": r[2],
+                "statut": r[3]
+            }
+            for r in rows
         ]
 
         return [types.TextContent(
-                      type="text",
-                      text=json.dumps(documents, ensure_ascii=False, indent=2)
+            type="text",
+            text=_dumps(documents)
         )]
 
-elif name == "statistiques_base":
-        db_path = Path("ingestion_tracker.db")
-        if not db_path.exists():
-                      return [types.TextContent(type="text", text="Base de donnees non trouvee.")]
+    elif name == "statistiques_base":
+        if not _DB_PATH.exists():
+            return [types.TextContent(type="text", text="Base de donnees non trouvee.")]
 
-        conn = sqlite3.connect(str(db_path))
-        stats_rows = conn.execute(
-                      "SELECT status, COUNT(*), SUM(chunk_count) FROM indexed_files GROUP BY status"
-        ).fetchall()
-        conn.close()
+        stats_rows = await asyncio.to_thread(_stats_sync)
 
+        # La derniere ligne (__total__) porte les totaux deja agreges
+        *per_status, totals = stats_rows
         stats = {
-                      "par_statut": {r[0]: {"fichiers": r[1], "chunks": r[2] or 0} for r in stats_rows},
-                      "total_fichiers": sum(r[1] for r in stats_rows),
-                      "total_chunks": sum((r[2] or 0) for r in stats_rows),
+            "par_statut": {r[0]: {"fichiers": r[1], "chunks": r[2]} for r in per_status},
+            "total_fichiers": totals[1] or 0,
+            "total_chunks": totals[2] or 0,
         }
 
         return [types.TextContent(
-                      type="text",
-                      text=json.dumps(stats, ensure_ascii=False, indent=2)
+            type="text",
+            text=_dumps(stats)
         )]
 
-else:
+    else:
         return [types.TextContent(type="text", text=f"Outil inconnu : {name}")]
 
 
+_RESOURCES = [
+    types.Resource(
+        uri="documents://index",
+        name="Index documentaire",
+        description="Liste complete des documents indexes dans la base de connaissance",
+        mimeType="application/json",
+    )
+]
+
+
 @app.list_resources()
 async def list_resources() -> list[types.Resource]:
-      """Liste les ressources MCP disponibles."""
-    return [
-              types.Resource(
-                            uri="documents://index",
-                            name="Index documentaire",
-                            description="Liste complete des documents indexes dans la base de connaissance",
-                            mimeType="application/json",
-              )
-    ]
+    """Liste les ressources MCP disponibles."""
+    return _RESOURCES
 
 
 @app.read_resource()
 async def read_resource(uri: str) -> str:
-      """Lit une ressource MCP."""
+    """Lit une ressource MCP."""
     if uri == "documents://index":
-              db_path = Path("ingestion_tracker.db")
-        if not db_path.exists():
-                      return "[]"
-        conn = sqlite3.connect(str(db_path))
-        rows = conn.execute(
-                      "SELECT filepath, indexed_at, chunk_count FROM indexed_files WHERE status = 'success'"
-        ).fetchall()
-        conn.close()
+        if not _DB_PATH.exists():
+            return "[]"
+        rows = await asyncio.to_thread(_resource_index_sync)
         documents = [{"fichier": Path(r[0]).name, "date": r[1], "chunks": r[2]} for r in rows]
-        return json.dumps(documents, ensure_ascii=False, indent=2)
+        return _dumps(documents)
     raise ValueError(f"Ressource inconnue : {uri}")
 
 
 async def main():
-      """Point d'entree du serveur MCP."""
+    """Point d'entree du serveur MCP."""
     async with stdio_server() as streams:
-              await app.run(
-                            streams[0],
-                            streams[1],
-                            app.create_initialization_options()
-              )
+        await app.run(
+            streams[0],
+            streams[1],
+            app.create_initialization_options()
+        )
 
 
 if __name__ == "__main__":
-      asyncio.run(main())
+    asyncio.run(main())
@@ -3,399 +3,1042 @@ Client MCP SharePoint pour le backend RAG.
 
 Se connecte au serveur MCP SharePoint pret a l'emploi :
   - Sofias-ai/mcp-sharepoint (pip install mcp-sharepoint-server)
-      https://github.com/Sofias-ai/mcp-sharepoint
-
-      Ce client expose les 10 outils SharePoint comme fonctions Python
-      utilisables directement dans le pipeline RAG et le serveur MCP FastAPI.
-
-      Outils disponibles :
-        - list_sharepoint_folders     : lister les dossiers
-          - list_sharepoint_documents   : lister les documents d'un dossier
-            - get_document_content        : lire le contenu d'un document (PDF/DOCX/XLSX)
-              - upload_document             : uploader un document
-                - update_document             : mettre a jour un document
-                  - delete_document             : supprimer un document
-                    - create_folder               : creer un dossier
-                      - delete_folder               : supprimer un dossier
-                        - get_sharepoint_tree         : arborescence complete
-                          - upload_document_from_path   : uploader depuis un chemin local
-                          """
+    https://github.com/Sofias-ai/mcp-sharepoint
+
+Ce client expose les 10 outils SharePoint comme fonctions Python
+utilisables directement dans le pipeline RAG et le serveur MCP FastAPI.
+
+Outils disponibles :
+  - list_sharepoint_folders     : lister les dossiers
+  - list_sharepoint_documents   : lister les documents d'un dossier
+  - get_document_content        : lire le contenu d'un document (PDF/DOCX/XLSX)
+  - upload_document             : uploader un document
+  - update_document             : mettre a jour un document
+  - delete_document             : supprimer un document
+  - create_folder               : creer un dossier
+  - delete_folder               : supprimer un dossier
+  - get_sharepoint_tree         : arborescence complete
+  - upload_document_from_path   : uploader depuis un chemin local
+"""
 
 import asyncio
-import json
+import base64
+import functools
+import hashlib
 import logging
 import os
-import subprocess
+import re
 import sys
+import time
+from contextlib import AsyncExitStack
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 
+import aiofiles
 import httpx
+import orjson
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
+try:
+    from mcp.client.streamable_http import streamablehttp_client
+except ImportError:  # versions mcp sans transport HTTP streamable
+    streamablehttp_client = None
+
 from app.core.config import settings
+from app.core.redis import get_redis
 
 logger = logging.getLogger(__name__)
 
 
+class _SessionKeeper:
+    """
+    Tache proprietaire d'une session MCP.
+
+    Les cancel scopes anyio de stdio_client/ClientSession sont lies a la
+    tache qui les a ouverts : creation et fermeture doivent se faire dans
+    la meme tache, sinon aclose() leve "Attempted to exit cancel scope in
+    a different task" et le subprocess serveur fuit. Le keeper ouvre la
+    session, attend le signal de fermeture et la demonte lui-meme ;
+    aclose() peut etre appelee depuis n'importe quelle tache (reaper,
+    discard, shutdown).
+    """
+
+    __slots__ = ("session", "_closing", "_task")
+
+    def __init__(self):
+        self.session: ClientSession | None = None
+        self._closing = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self, open_session) -> ClientSession:
+        """Lance la tache proprietaire et attend la session initialisee."""
+        ready: asyncio.Future = asyncio.get_running_loop().create_future()
+
+        async def run():
+            stack = AsyncExitStack()
+            try:
+                session = await open_session(stack)
+            except Exception as e:
+                await stack.aclose()
+                ready.set_exception(e)
+                return
+            self.session = session
+            ready.set_result(session)
+            await self._closing.wait()
+            await stack.aclose()
+
+        self._task = asyncio.create_task(run())
+        return await ready
+
+    async def aclose(self):
+        """Signale la fermeture et attend le demontage effectif."""
+        self._closing.set()
+        if self._task is not None:
+            await self._task
+
+
+# Une entree du pool : (session, keeper proprietaire, date de creation monotonic)
+_PoolEntry = tuple[ClientSession, _SessionKeeper, float]
+
+
+class MCPSessionPool:
+    """
+    Pool de sessions MCP reutilisables.
+
+    Une session stdio ne traite qu'une requete JSON-RPC a la fois :
+    plusieurs sessions permettent aux appels concurrents (ingest RAG,
+    recherche multi-dossiers) de se recouvrir reellement. Les sessions
+    inactives depuis plus de session_ttl sont fermees et recreees.
+    """
+
+    def __init__(self, factory, max_sessions: int = 4, session_ttl: float = 300.0):
+        self._factory = factory
+        self._max_sessions = max_sessions
+        self._ttl = session_ttl
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self._reaper_task: asyncio.Task | None = None
+
+    async def acquire(self) -> _PoolEntry:
+        """Prend une session du pool, en creant une si besoin (borne)."""
+        while not self._idle.empty():
+            entry = self._idle.get_nowait()
+            if time.monotonic() - entry[2] < self._ttl:
+                return entry
+            await self._dispose(entry)
+
+        async with self._lock:
+            if self._size < self._max_sessions:
+                self._size += 1
+                try:
+                    session, stack = await self._factory()
+                except Exception:
+                    self._size -= 1
+                    raise
+                return (session, stack, time.monotonic())
+
+        # Pool plein : attendre qu'une session se libere
+        return await self._idle.get()
+
+    async def release(self, entry: _PoolEntry):
+        """Rend une session saine au pool."""
+        self._idle.put_nowait(entry)
+
+    async def discard(self, entry: _PoolEntry):
+        """Ferme une session cassee ; la suivante sera recreee a la demande."""
+        await self._dispose(entry)
+
+    async def _dispose(self, entry: _PoolEntry):
+        self._size -= 1
+        try:
+            await entry[1].aclose()
+        except Exception as e:
+            logger.warning(f"Fermeture session MCP en echec: {e}")
+
+    def start_reaper(self):
+        """Demarre la tache de fond qui purge les sessions perimees."""
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reaper())
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self._ttl / 2)
+            fresh = []
+            while not self._idle.empty():
+                entry = self._idle.get_nowait()
+                if time.monotonic() - entry[2] < self._ttl:
+                    fresh.append(entry)
+                else:
+                    await self._dispose(entry)
+            for entry in fresh:
+                self._idle.put_nowait(entry)
+
+    async def close(self):
+        """Ferme toutes les sessions inactives et arrete le reaper."""
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        while not self._idle.empty():
+            await self._dispose(self._idle.get_nowait())
+
+
 class SharePointMCPClient:
-      """
-          Client pour le serveur MCP SharePoint (Sofias-ai/mcp-sharepoint).
+    """
+    Client pour le serveur MCP SharePoint (Sofias-ai/mcp-sharepoint).
+
+    Mode de connexion : stdio (subprocess) — le serveur MCP tourne
+    comme processus enfant et communique via stdin/stdout en JSON-RPC.
+
+    En production Docker, le serveur tourne dans son propre conteneur
+    et on se connecte via SSE/HTTP.
 
-              Mode de connexion : stdio (subprocess) — le serveur MCP tourne
-                  comme processus enfant et communique via stdin/stdout en JSON-RPC.
+    Les sessions sont persistantes et mutualisees dans un MCPSessionPool :
+    chaque appel outil est un simple aller-retour JSON-RPC au lieu de
+    spawn + initialize + appel + teardown, et les appels concurrents se
+    repartissent sur plusieurs sessions.
+    """
 
-                      En production Docker, le serveur tourne dans son propre conteneur
-                          et on se connecte via SSE/HTTP.
-                              """
+    __slots__ = (
+        "_pool",
+        "_start_lock",
+        "_available_tools",
+        "_tools_cache",
+        "_mode",
+        "_http_client",
+        "_health_task",
+        "_server_params_cache",
+        "_cache",
+    )
 
     def __init__(self):
-              self._session: ClientSession | None = None
-              self._available_tools: list[str] = []
-              self._mode = os.getenv("MCP_CONNECTION_MODE", "subprocess")
+        self._pool = MCPSessionPool(self._new_session)
+        self._start_lock = asyncio.Lock()
+        self._available_tools: list[str] = []
+        self._tools_cache: list[dict] = []
+        self._mode = os.getenv("MCP_CONNECTION_MODE", "subprocess")
+        self._http_client: httpx.AsyncClient | None = None
+        self._health_task: asyncio.Task | None = None
+        self._server_params_cache: StdioServerParameters | None = None
+        # Cache TTL des listings : cle -> (timestamp monotonic, valeur)
+        self._cache: dict[tuple, tuple[float, Any]] = {}
 
     def _get_server_params(self) -> StdioServerParameters:
-              """Parametres de connexion au serveur MCP SharePoint."""
-              return StdioServerParameters(
-                  command=sys.executable,
-                  args=["-m", "mcp_sharepoint"],
-                  env={
-                      "SHP_ID_APP": settings.SHAREPOINT_CLIENT_ID,
-                      "SHP_ID_APP_SECRET": settings.SHAREPOINT_CLIENT_SECRET,
-                      "SHP_TENANT_ID": settings.SHAREPOINT_TENANT_ID,
-                      "SHP_SITE_URL": settings.SHAREPOINT_SITE_URL,
-                      "SHP_DOC_LIBRARY": getattr(settings, "SHAREPOINT_DOC_LIBRARY", "Shared Documents"),
-                      "SHP_MAX_DEPTH": str(getattr(settings, "SHP_MAX_DEPTH", 15)),
-                      "SHP_MAX_FOLDERS_PER_LEVEL": str(getattr(settings, "SHP_MAX_FOLDERS_PER_LEVEL", 100)),
-                      "SHP_LEVEL_DELAY": str(getattr(settings, "SHP_LEVEL_DELAY", 0.5)),
-                      **os.environ,
-                  },
-              )
+        """Parametres de connexion au serveur MCP SharePoint (calcules une
+        fois : la copie de os.environ et les getattr ne se repaient pas a
+        chaque session)."""
+        if self._server_params_cache is not None:
+            return self._server_params_cache
+        self._server_params_cache = StdioServerParameters(
+            command=sys.executable,
+            args=["-m", "mcp_sharepoint"],
+            env={
+                "SHP_ID_APP": settings.SHAREPOINT_CLIENT_ID,
+                "SHP_ID_APP_SECRET": settings.SHAREPOINT_CLIENT_SECRET,
+                "SHP_TENANT_ID": settings.SHAREPOINT_TENANT_ID,
+                "SHP_SITE_URL": settings.SHAREPOINT_SITE_URL,
+                "SHP_DOC_LIBRARY": getattr(settings, "SHAREPOINT_DOC_LIBRARY", "Shared Documents"),
+                "SHP_MAX_DEPTH": str(getattr(settings, "SHP_MAX_DEPTH", 15)),
+                "SHP_MAX_FOLDERS_PER_LEVEL": str(getattr(settings, "SHP_MAX_FOLDERS_PER_LEVEL", 100)),
+                "SHP_LEVEL_DELAY": str(getattr(settings, "SHP_LEVEL_DELAY", 0.5)),
+                **os.environ,
+            },
+        )
+        return self._server_params_cache
+
+    def _httpx_factory(self, headers=None, timeout=None, auth=None) -> httpx.AsyncClient:
+        """Client httpx persistant partage par toutes les sessions HTTP."""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                headers=headers,
+                timeout=timeout if timeout is not None else httpx.Timeout(30.0),
+                auth=auth,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            )
+        return self._http_client
+
+    async def _open_session(self, exit_stack: AsyncExitStack) -> ClientSession:
+        """Ouvre transport et session MCP (execute dans la tache keeper)."""
+        if self._mode == "http":
+            # Production Docker : serveur MCP dans son propre conteneur,
+            # connexions TCP/TLS reutilisees via le pool httpx partage
+            if streamablehttp_client is None:
+                raise RuntimeError(
+                    "MCP_CONNECTION_MODE=http requiert mcp avec le transport streamable HTTP"
+                )
+            url = getattr(settings, "MCP_SHAREPOINT_URL", "http://localhost:3001/mcp")
+            read, write, _ = await exit_stack.enter_async_context(
+                streamablehttp_client(url, httpx_client_factory=self._httpx_factory)
+            )
+        else:
+            read, write = await exit_stack.enter_async_context(
+                stdio_client(self._get_server_params())
+            )
+        session = await exit_stack.enter_async_context(
+            ClientSession(read, write)
+        )
+        await session.initialize()
+        return session
+
+    async def _new_session(self) -> tuple[ClientSession, _SessionKeeper]:
+        """Fabrique une session MCP initialisee, portee par sa tache keeper."""
+        keeper = _SessionKeeper()
+        session = await keeper.start(self._open_session)
+        logger.info("Session MCP SharePoint ouverte", extra={"mode": self._mode})
+        return session, keeper
+
+    async def start(self):
+        """Pre-chauffe le pool avec une premiere session (idempotent)."""
+        async with self._start_lock:
+            self._pool.start_reaper()
+            entry = await self._pool.acquire()
+            await self._pool.release(entry)
+            if self._health_task is None or self._health_task.done():
+                self._health_task = asyncio.create_task(self._health_loop())
+        # Liste d'outils chargee une fois au demarrage : les consommateurs
+        # (dont les probes) ne redeclenchent plus d'enumeration complete
+        if not self._tools_cache:
+            await self.list_tools(force_refresh=True)
+
+    async def _warm(self):
+        """Re-chauffe une session en arriere-plan apres un ping en echec."""
+        try:
+            entry = await self._pool.acquire()
+            await self._pool.release(entry)
+        except Exception as e:
+            logger.warning(f"Rechauffage session MCP impossible: {e}")
+
+    async def _health_loop(self):
+        """Ping periodique : une session morte est remplacee avant le
+        prochain appel outil plutot que pendant."""
+        while True:
+            await asyncio.sleep(30)
+            try:
+                entry = await self._pool.acquire()
+            except Exception as e:
+                logger.warning(f"Ping MCP SharePoint en echec: {e}")
+                continue
+            try:
+                await asyncio.wait_for(entry[0].send_ping(), 5.0)
+            except Exception:
+                await self._pool.discard(entry)
+                asyncio.create_task(self._warm())
+            else:
+                await self._pool.release(entry)
+
+    async def close(self):
+        """Ferme toutes les sessions (a appeler au shutdown FastAPI)."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        await self._pool.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def _cached(self, key: tuple, ttl: int, coro_fn) -> Any:
+        """Retourne la valeur cachee pour key, ou evalue coro_fn et la cache."""
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+        value = await coro_fn()
+        self._cache[key] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self, prefix: str = ""):
+        """
+        Invalide les listings caches touches par une ecriture.
+        Sans argument, vide tout le cache.
+        """
+        if not prefix:
+            self._cache.clear()
+            return
+        stale = [
+            k for k in self._cache
+            if str(k[1]).startswith(prefix) or prefix.startswith(str(k[1]))
+        ]
+        for key in stale:
+            del self._cache[key]
 
     async def _call_tool(self, tool_name: str, arguments: dict) -> Any:
-              """Appelle un outil MCP et retourne le resultat."""
-              try:
-                            server_params = self._get_server_params()
-                            async with stdio_client(server_params) as (read, write):
-                                async with ClientSession(read, write) as session:
-                                                      await session.initialize()
-                                                      result = await session.call_tool(tool_name, arguments)
-                                                      if result.content:
-                                                                                content = result.content[0]
-                                                                                if hasattr(content, "text"):
-                                                                                                              try:
-                                                                                                                                                return json.loads(content.text)
-                                                                                  except json.JSONDecodeError:
-                                                                                        return content.text
-                                                                            return None
-except Exception as e:
+        """Appelle un outil MCP et retourne le resultat."""
+        entry = await self._pool.acquire()
+        try:
+            # Timeout par appel : une extraction PDF bloquee ne doit pas
+            # retenir la session (ni plomber la latence de queue d'un lot)
+            async with asyncio.timeout(settings.MCP_CALL_TIMEOUT):
+                result = await entry[0].call_tool(tool_name, arguments)
+        except TimeoutError:
+            # La session garde une reponse orpheline en vol : on la jette,
+            # ce qui coupe aussi la requete cote serveur (fermeture du pipe)
+            await self._pool.discard(entry)
+            logger.error(
+                f"Timeout appel MCP {tool_name} apres {settings.MCP_CALL_TIMEOUT}s"
+            )
+            raise
+        except Exception as e:
+            # Session potentiellement cassee : on la jette, le pool en
+            # recreera une a l'appel suivant
+            await self._pool.discard(entry)
             logger.error(f"Erreur appel MCP {tool_name}: {e}")
             raise
+        await self._pool.release(entry)
 
-    async def list_tools(self) -> list[dict]:
-              """Liste tous les outils disponibles sur le serveur MCP."""
-              try:
-                            server_params = self._get_server_params()
-                            async with stdio_client(server_params) as (read, write):
-                                async with ClientSession(read, write) as session:
-                                                      await session.initialize()
-                                                      tools = await session.list_tools()
-                                                      return [
-                                                          {
-                                                              "name": t.name,
-                                                              "description": t.description,
-                                                              "input_schema": t.inputSchema,
-                                                          }
-                                                          for t in tools.tools
-                                                      ]
-              except Exception as e:
-                            logger.error(f"Erreur list_tools MCP: {e}")
-                            return []
-
-          # ─── 10 outils SharePoint ─────────────────────────────────
+        if result.content:
+            content = result.content[0]
+            if hasattr(content, "text"):
+                try:
+                    # orjson : decode 3-5x plus rapide, critique pour les
+                    # arborescences profondes et les gros contenus extraits
+                    return orjson.loads(content.text)
+                except orjson.JSONDecodeError:
+                    return content.text
+        return None
+
+    async def list_tools(self, force_refresh: bool = False) -> list[dict]:
+        """Liste tous les outils disponibles sur le serveur MCP (cache)."""
+        if self._tools_cache and not force_refresh:
+            return self._tools_cache
+        try:
+            entry = await self._pool.acquire()
+            try:
+                tools = await entry[0].list_tools()
+            except Exception:
+                await self._pool.discard(entry)
+                raise
+            await self._pool.release(entry)
+            self._tools_cache = [
+                {
+                    "name": t.name,
+                    "description": t.description,
+                    "input_schema": t.inputSchema,
+                }
+                for t in tools.tools
+            ]
+            self._available_tools = [t["name"] for t in self._tools_cache]
+            return self._tools_cache
+        except Exception as e:
+            logger.error(f"Erreur list_tools MCP: {e}")
+            return []
+
+    # ─── 10 outils SharePoint ─────────────────────────────────
 
     async def list_sharepoint_folders(
-              self,
-              folder_path: str = "",
+        self,
+        folder_path: str = "",
     ) -> list[dict]:
-              """
-                      Liste tous les dossiers dans un chemin SharePoint.
+        """
+        Liste tous les dossiers dans un chemin SharePoint.
 
-                              Args:
-                                          folder_path: Chemin relatif (ex: "Procedures/2024"). Vide = racine.
+        Args:
+            folder_path: Chemin relatif (ex: "Procedures/2024"). Vide = racine.
 
-                                                  Returns:
-                                                              Liste de dossiers avec name, path, item_count.
-                                                                      """
-              result = await self._call_tool(
-                  "List_SharePoint_Folders",
-                  {"folder_path": folder_path},
-              )
-              return result or []
+        Returns:
+            Liste de dossiers avec name, path, item_count.
+        """
+        result = await self._cached(
+            ("folders", folder_path),
+            settings.SHP_TREE_CACHE_TTL,
+            lambda: self._call_tool(
+                "List_SharePoint_Folders",
+                {"folder_path": folder_path},
+            ),
+        )
+        return result or []
 
     async def list_sharepoint_documents(
-              self,
-              folder_path: str = "",
+        self,
+        folder_path: str = "",
     ) -> list[dict]:
-              """
-                      Liste tous les documents dans un dossier SharePoint.
+        """
+        Liste tous les documents dans un dossier SharePoint.
 
-                              Args:
-                                          folder_path: Chemin du dossier (ex: "Documents/Normes").
+        Args:
+            folder_path: Chemin du dossier (ex: "Documents/Normes").
 
-                                                  Returns:
-                                                              Liste de documents avec name, size, modified, url.
-                                                                      """
-              result = await self._call_tool(
-                  "List_SharePoint_Documents",
-                  {"folder_path": folder_path},
-              )
-              return result or []
+        Returns:
+            Liste de documents avec name, size, modified, url.
+        """
+        result = await self._cached(
+            ("documents", folder_path),
+            settings.SHP_TREE_CACHE_TTL,
+            lambda: self._call_tool(
+                "List_SharePoint_Documents",
+                {"folder_path": folder_path},
+            ),
+        )
+        return result or []
 
     async def get_document_content(
-              self,
-              file_path: str,
+        self,
+        file_path: str,
     ) -> str:
-              """
-                      Recupere et extrait le contenu texte d'un document.
-                              Supporte : PDF (PyMuPDF), Word (python-docx), Excel (openpyxl),
-                                                 TXT, JSON, XML, HTML, Markdown.
-
-                                                         Args:
-                                                                     file_path: Chemin complet dans SharePoint (ex: "Documents/rapport.pdf").
-
-                                                                             Returns:
-                                                                                         Contenu textuel extrait du document.
-                                                                                                 """
-              result = await self._call_tool(
-                  "Get_Document_Content",
-                  {"file_path": file_path},
-              )
-              if isinstance(result, dict):
-                            return result.get("content", str(result))
-                        return str(result) if result else ""
+        """
+        Recupere et extrait le contenu texte d'un document.
+        Supporte : PDF (PyMuPDF), Word (python-docx), Excel (openpyxl),
+        TXT, JSON, XML, HTML, Markdown.
+
+        Args:
+            file_path: Chemin complet dans SharePoint (ex: "Documents/rapport.pdf").
+
+        Returns:
+            Contenu textuel extrait du document.
+        """
+        result = await self._call_tool(
+            "Get_Document_Content",
+            {"file_path": file_path},
+        )
+        if isinstance(result, dict):
+            return result.get("content", str(result))
+        return str(result) if result else ""
+
+    async def stream_document_content(
+        self,
+        file_path: str,
+        window: int = 1 << 20,
+    ) -> AsyncIterator[str]:
+        """
+        Itere le contenu d'un document par morceaux.
+
+        Si le serveur sait repondre par une ressource MCP
+        (return_resource), chaque bloc de contenu de la ressource est
+        produit tel quel ; sinon le texte est decoupe en fenetres de
+        `window` caracteres. Le chunker RAG consomme l'iterateur sans que
+        l'appelant n'ait a concatener le document complet.
+
+        Args:
+            file_path: Chemin complet dans SharePoint.
+            window: Taille de fenetre du repli texte-complet.
+        """
+        result = await self._call_tool(
+            "Get_Document_Content",
+            {"file_path": file_path, "return_resource": True},
+        )
+
+        uri = result.get("resource_uri") if isinstance(result, dict) else None
+        if uri:
+            entry = await self._pool.acquire()
+            try:
+                resource = await entry[0].read_resource(uri)
+            except Exception:
+                await self._pool.discard(entry)
+                raise
+            await self._pool.release(entry)
+            for content in resource.contents:
+                text = getattr(content, "text", "")
+                if text:
+                    yield text
+            return
+
+        if isinstance(result, dict):
+            text = result.get("content", "")
+        else:
+            text = str(result) if result else ""
+        for i in range(0, len(text), window):
+            yield text[i:i + window]
+
+    async def get_document_content_cached(
+        self,
+        file_path: str,
+        modified: str,
+    ) -> str:
+        """
+        Contenu d'un document, avec cache Redis adresse par contenu.
+
+        La cle combine chemin et date de modification (issue de
+        list_sharepoint_documents) : re-indexer un corpus inchange ne
+        declenche plus aucune extraction PDF/DOCX cote serveur MCP.
+
+        Args:
+            file_path: Chemin complet dans SharePoint.
+            modified: Horodatage de derniere modification du document.
+
+        Returns:
+            Contenu textuel extrait du document.
+        """
+        digest = hashlib.blake2b(
+            f"{file_path}|{modified}".encode(), digest_size=16
+        ).hexdigest()
+        cache_key = f"spmcp:doc:{digest}"
+
+        r = get_redis()
+        cached = await r.get(cache_key)
+        if cached is not None:
+            return cached
+
+        content = await self.get_document_content(file_path)
+        if content:
+            await r.set(cache_key, content, ex=settings.SHP_DOC_CACHE_TTL)
+        return content
 
     async def get_sharepoint_tree(
-              self,
-              root_path: str = "",
-              max_depth: int = 5,
+        self,
+        root_path: str = "",
+        max_depth: int = 5,
     ) -> dict:
-              """
-                      Retourne l'arborescence complete de SharePoint.
+        """
+        Retourne l'arborescence complete de SharePoint.
 
-                              Args:
-                                          root_path: Point de depart (vide = tout le site).
-                                                      max_depth: Profondeur maximale (defaut: 5).
+        Args:
+            root_path: Point de depart (vide = tout le site).
+            max_depth: Profondeur maximale (defaut: 5).
 
-                                                              Returns:
-                                                                          Arborescence JSON avec dossiers et fichiers.
-                                                                                  """
-        result = await self._call_tool(
-                      "Get_SharePoint_Tree",
-                      {"root_path": root_path, "max_depth": max_depth},
+        Returns:
+            Arborescence JSON avec dossiers et fichiers.
+        """
+        result = await self._cached(
+            ("tree", root_path, max_depth),
+            settings.SHP_TREE_CACHE_TTL,
+            lambda: self._call_tool(
+                "Get_SharePoint_Tree",
+                {"root_path": root_path, "max_depth": max_depth},
+            ),
         )
         return result or {}
 
     async def upload_document(
-              self,
-              folder_path: str,
-              file_name: str,
-              content: str,
-              is_binary: bool = False,
+        self,
+        folder_path: str,
+        file_name: str,
+        content: str,
+        is_binary: bool = False,
     ) -> dict:
-              """
-                      Upload un document dans SharePoint.
-
-                              Args:
-                                          folder_path: Dossier cible (ex: "Documents/Rapports").
-                                                      file_name: Nom du fichier (ex: "rapport_2024.docx").
-                                                                  content: Contenu (texte ou base64 si binaire).
-                                                                              is_binary: True si le contenu est en base64.
-
-                                                                                      Returns:
-                                                                                                  Infos du fichier cree.
-                                                                                                          """
-        return await self._call_tool(
-                      "Upload_Document",
-                      {
-                                        "folder_path": folder_path,
-                                        "file_name": file_name,
-                                        "content": content,
-                                        "is_binary": is_binary,
-                      },
+        """
+        Upload un document dans SharePoint.
+
+        Args:
+            folder_path: Dossier cible (ex: "Documents/Rapports").
+            file_name: Nom du fichier (ex: "rapport_2024.docx").
+            content: Contenu (texte ou base64 si binaire).
+            is_binary: True si le contenu est en base64.
+
+        Returns:
+            Infos du fichier cree.
+        """
+        result = await self._call_tool(
+            "Upload_Document",
+            {
+                "folder_path": folder_path,
+                "file_name": file_name,
+                "content": content,
+                "is_binary": is_binary,
+            },
         ) or {}
+        self.invalidate(folder_path)
+        return result
 
     async def upload_document_from_path(
-              self,
-              local_path: str,
-              folder_path: str,
-              file_name: Optional[str] = None,
+        self,
+        local_path: str,
+        folder_path: str,
+        file_name: Optional[str] = None,
     ) -> dict:
-              """
-                      Upload un fichier local vers SharePoint.
-
-                              Args:
-                                          local_path: Chemin local du fichier.
-                                                      folder_path: Dossier cible dans SharePoint.
-                                                                  file_name: Nom de destination (si different du nom local).
-
-                                                                          Returns:
-                                                                                      Infos du fichier cree.
-                                                                                              """
-        return await self._call_tool(
-                      "Upload_Document_From_Path",
-                      {
-                                        "local_path": local_path,
-                                        "folder_path": folder_path,
-                                        "file_name": file_name or Path(local_path).name,
-                      },
+        """
+        Upload un fichier local vers SharePoint.
+
+        Args:
+            local_path: Chemin local du fichier.
+            folder_path: Dossier cible dans SharePoint.
+            file_name: Nom de destination (si different du nom local).
+
+        Returns:
+            Infos du fichier cree.
+        """
+        result = await self._call_tool(
+            "Upload_Document_From_Path",
+            {
+                "local_path": local_path,
+                "folder_path": folder_path,
+                "file_name": file_name or local_path.rpartition("/")[2] or local_path,
+            },
         ) or {}
+        self.invalidate(folder_path)
+        return result
+
+    async def upload_large_file(
+        self,
+        local_path: str,
+        folder_path: str,
+        file_name: Optional[str] = None,
+        chunk_size: int = 64 * 1024,
+    ) -> dict:
+        """
+        Upload un fichier local volumineux vers SharePoint.
+
+        Le serveur Sofias-ai/mcp-sharepoint n'expose pas d'upload par
+        morceaux : on lit et encode donc le fichier en base64 par fenetres
+        de 64 Ko (alignees sur 3 octets) avant un Upload_Document unique.
+        Le fichier brut n'est jamais entierement resident en memoire.
+
+        Args:
+            local_path: Chemin local du fichier.
+            folder_path: Dossier cible dans SharePoint.
+            file_name: Nom de destination (si different du nom local).
+            chunk_size: Taille de fenetre de lecture.
+
+        Returns:
+            Infos du fichier cree.
+        """
+        name = file_name or Path(local_path).name
+        encoded_parts: list[str] = []
+        carry = b""
+        async with aiofiles.open(local_path, "rb") as f:
+            while chunk := await f.read(chunk_size):
+                data = carry + chunk
+                # base64 encode par blocs multiples de 3 octets : les
+                # fenetres se concatenent sans padding intermediaire
+                usable = len(data) - (len(data) % 3)
+                encoded_parts.append(base64.b64encode(data[:usable]).decode("ascii"))
+                carry = data[usable:]
+        if carry:
+            encoded_parts.append(base64.b64encode(carry).decode("ascii"))
+
+        return await self.upload_document(
+            folder_path,
+            name,
+            "".join(encoded_parts),
+            is_binary=True,
+        )
 
     async def update_document(
-              self,
-              file_path: str,
-              content: str,
-              is_binary: bool = False,
+        self,
+        file_path: str,
+        content: str,
+        is_binary: bool = False,
     ) -> dict:
-              """
-                      Met a jour le contenu d'un document existant dans SharePoint.
-
-                              Args:
-                                          file_path: Chemin complet dans SharePoint.
-                                                      content: Nouveau contenu.
-                                                                  is_binary: True si base64.
-                                                                          """
-        return await self._call_tool(
-                      "Update_Document",
-                      {"file_path": file_path, "content": content, "is_binary": is_binary},
+        """
+        Met a jour le contenu d'un document existant dans SharePoint.
+
+        Args:
+            file_path: Chemin complet dans SharePoint.
+            content: Nouveau contenu.
+            is_binary: True si base64.
+        """
+        result = await self._call_tool(
+            "Update_Document",
+            {"file_path": file_path, "content": content, "is_binary": is_binary},
         ) or {}
+        self.invalidate(file_path.rpartition("/")[0])
+        return result
 
     async def delete_document(self, file_path: str) -> dict:
-              """
-                      Supprime un document de SharePoint.
-
-                              Args:
-                                          file_path: Chemin complet dans SharePoint.
-                                                  """
-        return await self._call_tool(
-                      "Delete_Document",
-                      {"file_path": file_path},
+        """
+        Supprime un document de SharePoint.
+
+        Args:
+            file_path: Chemin complet dans SharePoint.
+        """
+        result = await self._call_tool(
+            "Delete_Document",
+            {"file_path": file_path},
         ) or {}
+        self.invalidate(file_path.rpartition("/")[0])
+        return result
 
     async def create_folder(self, folder_path: str) -> dict:
-              """
-                      Cree un nouveau dossier dans SharePoint.
-
-                              Args:
-                                          folder_path: Chemin complet du dossier a creer.
-                                                  """
-        return await self._call_tool(
-                      "Create_Folder",
-                      {"folder_path": folder_path},
+        """
+        Cree un nouveau dossier dans SharePoint.
+
+        Args:
+            folder_path: Chemin complet du dossier a creer.
+        """
+        result = await self._call_tool(
+            "Create_Folder",
+            {"folder_path": folder_path},
         ) or {}
+        self.invalidate(folder_path.rpartition("/")[0])
+        return result
 
     async def delete_folder(self, folder_path: str) -> dict:
-              """
-                      Supprime un dossier vide de SharePoint.
-
-                              Args:
-                                          folder_path: Chemin complet du dossier a supprimer.
-                                                  """
-        return await self._call_tool(
-                      "Delete_Folder",
-                      {"folder_path": folder_path},
+        """
+        Supprime un dossier vide de SharePoint.
+
+        Args:
+            folder_path: Chemin complet du dossier a supprimer.
+        """
+        result = await self._call_tool(
+            "Delete_Folder",
+            {"folder_path": folder_path},
         ) or {}
+        self.invalidate(folder_path.rpartition("/")[0])
+        return result
 
     # ─── Methodes utilitaires ──────────────────────────────────
 
+    async def call_tools_batch(
+        self,
+        calls: list[tuple[str, dict]],
+        concurrency: int = 4,
+    ) -> list[Any]:
+        """
+        Execute un lot d'appels outils en parallele sur le pool de sessions.
+
+        Le client MCP Python n'expose pas l'ecriture de batchs JSON-RPC
+        bruts ; la depeche concurrente bornee sur plusieurs sessions donne
+        le meme recouvrement des allers-retours.
+
+        Returns:
+            Resultats dans l'ordre des appels ; une exception par entree
+            en echec (return_exceptions).
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(tool_name: str, arguments: dict):
+            async with sem:
+                return await self._call_tool(tool_name, arguments)
+
+        return await asyncio.gather(
+            *(one(name, args) for name, args in calls),
+            return_exceptions=True,
+        )
+
+    async def list_many_folders(
+        self,
+        paths: list[str],
+        concurrency: int = 8,
+    ) -> list:
+        """
+        Liste les documents de plusieurs dossiers en parallele.
+
+        Args:
+            paths: Chemins de dossiers SharePoint.
+            concurrency: Nombre maximal de listings simultanes.
+
+        Returns:
+            Une liste de documents (ou exception) par dossier, dans l'ordre.
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(path: str):
+            async with sem:
+                return await self.list_sharepoint_documents(path)
+
+        return await asyncio.gather(
+            *(one(p) for p in paths),
+            return_exceptions=True,
+        )
+
+    @staticmethod
+    def _tree_folder_paths(node: Any) -> list[str]:
+        """Extrait recursivement les chemins de dossiers d'une arborescence."""
+        paths: list[str] = []
+        if isinstance(node, dict):
+            path = node.get("path")
+            if path and (node.get("type") == "folder" or "folders" in node or "children" in node):
+                paths.append(path)
+            for key in ("folders", "children"):
+                for child in node.get(key) or []:
+                    paths.extend(SharePointMCPClient._tree_folder_paths(child))
+        elif isinstance(node, list):
+            for child in node:
+                paths.extend(SharePointMCPClient._tree_folder_paths(child))
+        return paths
+
+    async def batch_get_document_content(self, paths: list[str]) -> list[str]:
+        """
+        Recupere le contenu de plusieurs documents en un seul lot.
+
+        Args:
+            paths: Chemins SharePoint complets.
+
+        Returns:
+            Contenus textuels, dans l'ordre des chemins ("" en cas d'echec).
+        """
+        results = await self.call_tools_batch(
+            [("Get_Document_Content", {"file_path": p}) for p in paths]
+        )
+        contents = []
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                logger.error(f"Echec contenu {path}: {result}")
+                contents.append("")
+            elif isinstance(result, dict):
+                contents.append(result.get("content", str(result)))
+            else:
+                contents.append(str(result) if result else "")
+        return contents
+
     async def search_documents(
-              self,
-              query: str,
-              folder_path: str = "",
+        self,
+        query: str,
+        folder_path: str = "",
+        fetch_content: bool = False,
     ) -> list[dict]:
-              """
-                      Recherche des documents par nom dans SharePoint.
-                              (Filtre cote client sur la liste des documents)
-
-                                      Args:
-                                                  query: Terme de recherche (insensible a la casse).
-                                                              folder_path: Dossier a explorer (vide = tout).
-
-                                                                      Returns:
-                                                                                  Liste des documents correspondants.
-                                                                                          """
-        all_docs = await self.list_sharepoint_documents(folder_path)
-        query_lower = query.lower()
-        return [
-                      doc for doc in all_docs
-                      if query_lower in str(doc.get("name", "")).lower()
+        """
+        Recherche des documents par nom dans SharePoint.
+        (Filtre cote client sur la liste des documents)
+
+        Args:
+            query: Terme de recherche (insensible a la casse).
+            folder_path: Dossier a explorer (vide = tout).
+            fetch_content: Si True, recupere aussi les contenus en un lot.
+
+        Returns:
+            Liste des documents correspondants.
+        """
+        # Filtrage serveur quand le serveur MCP le supporte : le payload
+        # revient deja reduit et le scan local devient inutile
+        if folder_path or query:
+            try:
+                result = await self._call_tool(
+                    "List_SharePoint_Documents",
+                    {"folder_path": folder_path, "name_contains": query},
+                )
+            except Exception:
+                result = None
+            if result:
+                matches = result
+                if fetch_content and matches:
+                    paths = [doc.get("path") or doc.get("name", "") for doc in matches]
+                    contents = await self.batch_get_document_content(paths)
+                    for doc, content in zip(matches, contents):
+                        doc["content"] = content
+                return matches
+
+        if folder_path:
+            all_docs = await self.list_sharepoint_documents(folder_path)
+        else:
+            # Recherche globale : fan-out parallele sur les dossiers du haut
+            # de l'arborescence au lieu du seul listing racine
+            all_docs = await self.list_sharepoint_documents("")
+            tree = await self.get_sharepoint_tree(max_depth=2)
+            subfolders = self._tree_folder_paths(tree)
+            if subfolders:
+                for batch in await self.list_many_folders(subfolders):
+                    if isinstance(batch, list):
+                        all_docs.extend(batch)
+        # Regex insensible a la casse compilee une fois : pas de copie
+        # .lower() de chaque nom
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        matches = [
+            doc for doc in all_docs
+            if pattern.search(str(doc.get("name", "")))
         ]
+        if fetch_content and matches:
+            paths = [doc.get("path") or doc.get("name", "") for doc in matches]
+            contents = await self.batch_get_document_content(paths)
+            for doc, content in zip(matches, contents):
+                doc["content"] = content
+        return matches
 
     async def get_document_for_rag(self, file_path: str) -> dict:
-              """
-                      Recupere un document avec son contenu pour l'indexation RAG.
+        """
+        Recupere un document avec son contenu pour l'indexation RAG.
 
-                              Returns:
-                                          Dict avec: file_path, content, metadata.
-                                                  """
+        Returns:
+            Dict avec: file_path, content, metadata.
+        """
         content = await self.get_document_content(file_path)
-        filename = Path(file_path).name
+        # rpartition plutot que pathlib : pas de construction d'objet Path
+        # par fichier sur un parcours d'indexation de milliers de documents
+        filename = file_path.rpartition("/")[2] or file_path
+        ext = filename.rpartition(".")[2].lower() if "." in filename else ""
         return {
-                      "file_path": file_path,
-                      "filename": filename,
-                      "content": content,
-                      "source": "sharepoint_mcp",
-                      "file_type": Path(filename).suffix.lower(),
+            "file_path": file_path,
+            "filename": filename,
+            "content": content,
+            "source": "sharepoint_mcp",
+            "file_type": f".{ext}" if ext else "",
         }
 
+    async def iter_documents_for_rag(
+        self,
+        paths: list[str],
+        prefetch: int = 8,
+    ) -> AsyncIterator[dict]:
+        """
+        Itere les documents prets pour l'indexation RAG avec prefetch.
+
+        Un producteur recupere jusqu'a `prefetch` contenus en avance
+        pendant que le consommateur (embedder) travaille : le temps
+        d'ingestion tend vers max(fetch, embed) au lieu de leur somme.
+
+        Args:
+            paths: Chemins SharePoint complets.
+            prefetch: Nombre de recuperations en avance.
+
+        Yields:
+            Dicts au format de get_document_for_rag.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+        sem = asyncio.Semaphore(prefetch)
+
+        async def one(path: str):
+            async with sem:
+                try:
+                    doc = await self.get_document_for_rag(path)
+                except Exception as e:
+                    logger.error(f"Echec document RAG {path}: {e}")
+                    return
+                await queue.put(doc)
+
+        async def producer():
+            await asyncio.gather(*(one(p) for p in paths))
+            await queue.put(None)
+
+        producer_task = asyncio.create_task(producer())
+        try:
+            while (doc := await queue.get()) is not None:
+                yield doc
+        finally:
+            producer_task.cancel()
+
     async def health_check(self) -> bool:
-              """Verifie que le serveur MCP SharePoint est accessible."""
+        """Verifie que le serveur MCP SharePoint repond (ping leger)."""
         try:
-                      tools = await self.list_tools()
-                      logger.info(f"MCP SharePoint: {len(tools)} outils disponibles")
-                      return len(tools) > 0
-except Exception as e:
+            entry = await self._pool.acquire()
+            try:
+                await asyncio.wait_for(entry[0].send_ping(), 2.0)
+            except Exception:
+                await self._pool.discard(entry)
+                raise
+            await self._pool.release(entry)
+            return True
+        except Exception as e:
             logger.error(f"MCP SharePoint health check failed: {e}")
             return False
 
 
 # ─── Singleton ─────────────────────────────────────────────────
 
-_sharepoint_mcp_client: SharePointMCPClient | None = None
-
-
+@functools.lru_cache(maxsize=1)
 def get_sharepoint_mcp_client() -> SharePointMCPClient:
-      """Dependency injection FastAPI."""
-    global _sharepoint_mcp_client
-    if _sharepoint_mcp_client is None:
-              _sharepoint_mcp_client = SharePointMCPClient()
-    return _sharepoint_mcp_client
+    """
+    Dependency injection FastAPI.
+
+    lru_cache rend la construction atomique (pas de course check-then-set
+    entre requetes concurrentes au demarrage) ; la session est pre-chauffee
+    dans le lifespan de main.py.
+    """
+    return SharePointMCPClient()
 
 
 # ─── Test rapide ───────────────────────────────────────────────
 
 if __name__ == "__main__":
-      async def test():
-                client = SharePointMCPClient()
+    async def test():
+        client = SharePointMCPClient()
 
         print("=== Test MCP SharePoint (Sofias-ai/mcp-sharepoint) ===")
 
         print("\n1. Outils disponibles:")
         tools = await client.list_tools()
         for t in tools:
-                      print(f"   - {t['name']}: {t['description'][:60]}...")
+            print(f"   - {t['name']}: {t['description'][:60]}...")
 
         print("\n2. Liste des dossiers racine:")
         folders = await client.list_sharepoint_folders()
         for f in folders[:5]:
-                      print(f"   - {f}")
+            print(f"   - {f}")
 
         print("\n3. Documents a la racine:")
         docs = await client.list_sharepoint_documents()
         for d in docs[:5]:
-                      print(f"   - {d}")
+            print(f"   - {d}")
 
         print("\n=== Test termine ===")
 
+        await client.close()
+
     asyncio.run(test())
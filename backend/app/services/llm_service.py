@@ -2,176 +2,209 @@
 Service LLM - Abstraction multi-providers
 Supporte : Ollama (local), Groq, Google Gemini, OpenAI, Mock (tests)
 """
-from typing import AsyncGenerator, List
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Callable, List
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
 import structlog
 
 from app.core.config import settings
 
 logger = structlog.get_logger()
 
+# Dispatch role -> classe de message : un lookup dict remplace la
+# cascade if/elif sur le chemin chaud
+_MSG_CLS = {"system": SystemMessage, "assistant": AIMessage}
+
+# Seuil de memoization : au-dela, le contenu est un prompt RAG unique
+# (contexte documentaire complet) qui ne reviendra jamais - le cacher
+# epinglerait des kilo-octets morts en memoire process
+_MEMO_MAX_CONTENT = 512
+
+
+@lru_cache(maxsize=1024)
+def _to_lc_cached(role: str, content: str) -> HumanMessage | SystemMessage | AIMessage:
+    return _MSG_CLS.get(role, HumanMessage)(content=content)
+
+
+def _to_lc(role: str, content: str) -> HumanMessage | SystemMessage | AIMessage:
+    """
+    Convertit (role, contenu) en message langchain, memoize.
+
+    Un tour de chat rejoue tout l'historique : les (role, contenu) courts
+    deja convertis au tour precedent ressortent du cache au lieu d'etre
+    re-instancies. Les contenus longs contournent le cache.
+    """
+    if len(content) > _MEMO_MAX_CONTENT:
+        return _MSG_CLS.get(role, HumanMessage)(content=content)
+    return _to_lc_cached(role, content)
+
+
+def _to_lc_messages(messages: list) -> list:
+    """Convertit une liste de dicts {role, content} en messages langchain."""
+    return [
+        _to_lc(msg.get("role", "user"), msg.get("content", ""))
+        for msg in messages
+    ]
+
 
 class LLMService:
-      """Abstraction unifiee pour tous les providers LLM."""
+    """Abstraction unifiee pour tous les providers LLM."""
 
     def __init__(self):
-              self._llm = None
-              self._embeddings = None
-              self._provider = settings.LLM_PROVIDER
-              logger.info("LLM Service initialise", provider=self._provider)
+        self._llm = None
+        self._embeddings = None
+        self._provider = settings.LLM_PROVIDER
+        logger.info("LLM Service initialise", provider=self._provider)
 
     @property
     def llm(self):
-              if self._llm is None:
-                            self._llm = self._create_llm()
-                        return self._llm
+        if self._llm is None:
+            self._llm = self._create_llm()
+        return self._llm
 
     @property
     def embeddings(self):
-              if self._embeddings is None:
-                            self._embeddings = self._create_embeddings()
-                        return self._embeddings
+        if self._embeddings is None:
+            self._embeddings = self._create_embeddings()
+        return self._embeddings
 
     def _create_llm(self):
-              """Cree le client LLM selon le provider configure."""
-        if self._provider == "ollama":
-                      from langchain_ollama import ChatOllama
-                      return ChatOllama(
-                          base_url=settings.OLLAMA_BASE_URL,
-                          model=settings.LLM_MODEL,
-                          temperature=settings.LLM_TEMPERATURE,
-                          num_predict=settings.LLM_MAX_TOKENS,
-                      )
-
-elif self._provider == "groq":
-            from langchain_groq import ChatGroq
-            return ChatGroq(
-                              api_key=settings.GROQ_API_KEY,
-                              model=settings.LLM_MODEL,
-                              temperature=settings.LLM_TEMPERATURE,
-                              max_tokens=settings.LLM_MAX_TOKENS,
-            )
-
-elif self._provider == "gemini":
-            from langchain_google_genai import ChatGoogleGenerativeAI
-            return ChatGoogleGenerativeAI(
-                              google_api_key=settings.GOOGLE_API_KEY,
-                              model=settings.LLM_MODEL,
-                              temperature=settings.LLM_TEMPERATURE,
-                              max_output_tokens=settings.LLM_MAX_TOKENS,
-            )
-
-elif self._provider == "openai":
-            from langchain_openai import ChatOpenAI
-            return ChatOpenAI(
-                              api_key=settings.OPENAI_API_KEY,
-                              model=settings.LLM_MODEL,
-                              temperature=settings.LLM_TEMPERATURE,
-                              max_tokens=settings.LLM_MAX_TOKENS,
-            )
-
-elif self._provider == "mock":
-            return MockLLM()
-
-else:
+        """Cree le client LLM selon le provider configure."""
+        try:
+            return _LLM_FACTORIES[self._provider]()
+        except KeyError:
             raise ValueError(f"Provider LLM non supporte : {self._provider}")
 
     def _create_embeddings(self):
-              """Cree le client d'embeddings selon le provider configure."""
-        if self._provider == "ollama":
-                      from langchain_ollama import OllamaEmbeddings
-                      return OllamaEmbeddings(
-                          base_url=settings.OLLAMA_BASE_URL,
-                          model=settings.EMBEDDING_MODEL,
-                      )
-
-elif self._provider in ("groq", "gemini"):
-            from langchain_ollama import OllamaEmbeddings
-            logger.warning("Groq/Gemini n'ont pas d'embeddings - utilisation d'Ollama local")
-            return OllamaEmbeddings(
-                              base_url=settings.OLLAMA_BASE_URL,
-                              model=settings.EMBEDDING_MODEL,
-            )
-
-elif self._provider == "openai":
-            from langchain_openai import OpenAIEmbeddings
-            return OpenAIEmbeddings(
-                              api_key=settings.OPENAI_API_KEY,
-                              model="text-embedding-3-large",
-            )
-
-elif self._provider == "mock":
-            return MockEmbeddings()
-
-else:
-            from langchain_ollama import OllamaEmbeddings
-            return OllamaEmbeddings(
-                              base_url=settings.OLLAMA_BASE_URL,
-                              model=settings.EMBEDDING_MODEL,
-            )
+        """Cree le client d'embeddings selon le provider configure."""
+        # Repli Ollama pour tout provider sans embeddings dedies
+        return _EMBEDDING_FACTORIES.get(self._provider, _make_ollama_embeddings)()
 
     async def generate(self, messages: list) -> str:
-              """Genere une reponse complete (non-streaming)."""
-              from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-
-        lc_messages = []
-        for msg in messages:
-                      role = msg.get("role", "user")
-                      content = msg.get("content", "")
-                      if role == "system":
-                                        lc_messages.append(SystemMessage(content=content))
-elif role == "assistant":
-                lc_messages.append(AIMessage(content=content))
-else:
-                lc_messages.append(HumanMessage(content=content))
-
-        response = await self.llm.ainvoke(lc_messages)
+        """Genere une reponse complete (non-streaming)."""
+        response = await self.llm.ainvoke(_to_lc_messages(messages))
         return response.content
 
     async def generate_simple(self, prompt: str) -> str:
-              """Genere une reponse simple a partir d'un prompt texte."""
-              from langchain_core.messages import HumanMessage
-              response = await self.llm.ainvoke([HumanMessage(content=prompt)])
-              return response.content
+        """Genere une reponse simple a partir d'un prompt texte."""
+        response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+        return response.content
 
     async def stream(self, messages: list) -> AsyncGenerator[str, None]:
-              """Streame la reponse token par token."""
-              from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-
-        lc_messages = []
-        for msg in messages:
-                      role = msg.get("role", "user")
-                      content = msg.get("content", "")
-                      if role == "system":
-                                        lc_messages.append(SystemMessage(content=content))
-elif role == "assistant":
-                lc_messages.append(AIMessage(content=content))
-else:
-                lc_messages.append(HumanMessage(content=content))
-
-        async for chunk in self.llm.astream(lc_messages):
-                      if chunk.content:
-                                        yield chunk.content
+        """Streame la reponse token par token."""
+        async for chunk in self.llm.astream(_to_lc_messages(messages)):
+            if chunk.content:
+                yield chunk.content
 
 
 class MockLLM:
-      """LLM factice pour les tests - retourne des reponses predefinies."""
+    """LLM factice pour les tests - retourne des reponses predefinies."""
 
     async def ainvoke(self, messages):
-              from langchain_core.messages import AIMessage
-              return AIMessage(content="Reponse de test du chatbot RAG Expert Metier.")
+        return AIMessage(content="Reponse de test du chatbot RAG Expert Metier.")
 
     async def astream(self, messages):
-              tokens = ["Reponse", " de", " test", " du", " chatbot", " RAG."]
-              for token in tokens:
-                            from langchain_core.messages import AIMessageChunk
-                            yield AIMessageChunk(content=token)
+        tokens = ["Reponse", " de", " test", " du", " chatbot", " RAG."]
+        for token in tokens:
+            yield AIMessageChunk(content=token)
 
 
 class MockEmbeddings:
-      """Embeddings factices pour les tests."""
+    """Embeddings factices pour les tests."""
 
     def embed_documents(self, texts):
-              return [[0.1] * 768 for _ in texts]
+        return [[0.1] * 768 for _ in texts]
 
     def embed_query(self, text):
-              return [0.1] * 768
+        return [0.1] * 768
+
+    # Variantes async : la classe n'herite pas de langchain Embeddings,
+    # elle doit donc fournir elle-meme ce que le retrieval await-e
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+# ── Fabriques de clients par provider ─────────────────────────────────
+# Registre construit a l'import : le choix du provider est un lookup
+# dict, et chaque fabrique porte son import differe - les SDK des
+# providers non utilises ne sont jamais charges.
+
+def _make_ollama_llm():
+    from langchain_ollama import ChatOllama
+    return ChatOllama(
+        base_url=settings.OLLAMA_BASE_URL,
+        model=settings.LLM_MODEL,
+        temperature=settings.LLM_TEMPERATURE,
+        num_predict=settings.LLM_MAX_TOKENS,
+    )
+
+
+def _make_groq_llm():
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        api_key=settings.GROQ_API_KEY,
+        model=settings.LLM_MODEL,
+        temperature=settings.LLM_TEMPERATURE,
+        max_tokens=settings.LLM_MAX_TOKENS,
+    )
+
+
+def _make_gemini_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        google_api_key=settings.GOOGLE_API_KEY,
+        model=settings.LLM_MODEL,
+        temperature=settings.LLM_TEMPERATURE,
+        max_output_tokens=settings.LLM_MAX_TOKENS,
+    )
+
+
+def _make_openai_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        model=settings.LLM_MODEL,
+        temperature=settings.LLM_TEMPERATURE,
+        max_tokens=settings.LLM_MAX_TOKENS,
+    )
+
+
+def _make_ollama_embeddings():
+    from langchain_ollama import OllamaEmbeddings
+    return OllamaEmbeddings(
+        base_url=settings.OLLAMA_BASE_URL,
+        model=settings.EMBEDDING_MODEL,
+    )
+
+
+def _make_fallback_embeddings():
+    logger.warning("Groq/Gemini n'ont pas d'embeddings - utilisation d'Ollama local")
+    return _make_ollama_embeddings()
+
+
+def _make_openai_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(
+        api_key=settings.OPENAI_API_KEY,
+        model="text-embedding-3-large",
+    )
+
+
+_LLM_FACTORIES: dict[str, Callable[[], Any]] = {
+    "ollama": _make_ollama_llm,
+    "groq": _make_groq_llm,
+    "gemini": _make_gemini_llm,
+    "openai": _make_openai_llm,
+    "mock": lambda: MockLLM(),
+}
+
+_EMBEDDING_FACTORIES: dict[str, Callable[[], Any]] = {
+    "ollama": _make_ollama_embeddings,
+    "groq": _make_fallback_embeddings,
+    "gemini": _make_fallback_embeddings,
+    "openai": _make_openai_embeddings,
+    "mock": lambda: MockEmbeddings(),
+}
@@ -1,123 +1,142 @@
 """
 Service Memory - Gestion de l'historique des conversations via Redis
 """
-import json
 import time
 from typing import Optional
 
+import msgspec
 import redis.asyncio as aioredis
 import structlog
 
 from app.core.config import settings
+from app.core.redis import get_redis_binary_pool
 
 logger = structlog.get_logger()
 
 
 class MemoryService:
-      """Gestion de l'historique conversationnel via Redis."""
+    """Gestion de l'historique conversationnel via Redis."""
+
+    # Un echange = un element de liste Redis encode en msgpack : l'append
+    # est O(1) cote serveur, plus de re-serialisation de tout l'historique
+    _enc = msgspec.msgpack.Encoder()
+    _dec = msgspec.msgpack.Decoder()
 
     def __init__(self):
-              self._redis = None
+        self._redis = None
 
     @property
     def redis(self):
-              if self._redis is None:
-                            self._redis = aioredis.from_url(
-                                              settings.REDIS_URL,
-                                              encoding="utf-8",
-                                              decode_responses=True
-                            )
-                        return self._redis
+        if self._redis is None:
+            # Pool binaire partage du process (les echanges sont du msgpack)
+            self._redis = aioredis.Redis(connection_pool=get_redis_binary_pool())
+        return self._redis
 
     async def get_history(self, conversation_id: str) -> list:
-              """Recupere l'historique d'une conversation."""
-        data = await self.redis.get(f"conv:{conversation_id}")
-        if not data:
-                      return []
-                  try:
-                                return json.loads(data)
-except json.JSONDecodeError:
+        """Recupere l'historique d'une conversation."""
+        raw = await self.redis.lrange(f"conv:{conversation_id}", 0, -1)
+        try:
+            return [self._dec.decode(item) for item in raw]
+        except msgspec.DecodeError:
             return []
 
     async def save_exchange(
-              self,
-              conversation_id: str,
-              question: str,
-              answer: str,
-              sources: list,
-              user_id: str = "unknown"
+        self,
+        conversation_id: str,
+        question: str,
+        answer: str,
+        sources: list,
+        user_id: str = "unknown"
     ):
-              """Sauvegarde un echange question/reponse dans l'historique."""
-        history = await self.get_history(conversation_id)
-
-        exchange = {
-                      "question": question,
-                      "answer": answer,
-                      "sources": sources,
-                      "timestamp": time.time(),
-        }
-        history.append(exchange)
-
-        history = history[-settings.CONVERSATION_HISTORY_LENGTH * 2:]
-
-        await self.redis.setex(
-                      f"conv:{conversation_id}",
-                      settings.REDIS_SESSION_TTL,
-                      json.dumps(history)
-        )
-
-        meta = {
-                      "user_id": user_id,
-                      "last_activity": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        }
-        existing_meta = await self.redis.get(f"conv_meta:{conversation_id}")
-        if existing_meta:
-                      existing = json.loads(existing_meta)
-                      meta["started_at"] = existing.get("started_at", meta["last_activity"])
-else:
-            meta["started_at"] = meta["last_activity"]
-
-        await self.redis.setex(
-                      f"conv_meta:{conversation_id}",
-                      settings.REDIS_SESSION_TTL,
-                      json.dumps(meta)
-        )
-
-        await self.redis.sadd(f"user_convs:{user_id}", conversation_id)
-        await self.redis.expire(f"user_convs:{user_id}", settings.REDIS_SESSION_TTL * 7)
+        """
+        Sauvegarde un echange question/reponse dans l'historique.
+
+        RPUSH + LTRIM + EXPIRE dans un pipeline : append atomique en un
+        aller-retour, sans le cycle lire-decoder-reencoder-reecrire qui
+        perdait un echange quand deux sauvegardes se croisaient.
+        """
+        exchange = self._enc.encode({
+            "question": question,
+            "answer": answer,
+            "sources": sources,
+            "timestamp": time.time(),
+        })
+
+        conv_key = f"conv:{conversation_id}"
+        meta_key = f"conv_meta:{conversation_id}"
+        now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(conv_key, exchange)
+        pipe.ltrim(conv_key, -settings.CONVERSATION_HISTORY_LENGTH * 2, -1)
+        pipe.expire(conv_key, settings.REDIS_SESSION_TTL)
+
+        # Metadonnees en hash Redis : lecture directe via HGETALL,
+        # HSETNX fixe started_at atomiquement (plus de GET-test-SET)
+        pipe.hsetnx(meta_key, "started_at", now_iso)
+        pipe.hset(meta_key, mapping={"user_id": user_id, "last_activity": now_iso})
+        pipe.expire(meta_key, settings.REDIS_SESSION_TTL)
+
+        # Index global d'activite (listing et export admin tries par date)
+        pipe.zadd("conv:by_activity", {conversation_id: time.time()})
+
+        pipe.sadd(f"user_convs:{user_id}", conversation_id)
+        pipe.expire(f"user_convs:{user_id}", settings.REDIS_SESSION_TTL * 7)
+        await pipe.execute()
 
     async def list_conversations(self, user_id: str) -> list:
-              """Liste toutes les conversations d'un utilisateur."""
-        conv_ids = await self.redis.smembers(f"user_convs:{user_id}")
-        conversations = []
+        """Liste toutes les conversations d'un utilisateur."""
+        conv_ids = [c.decode() for c in await self.redis.smembers(f"user_convs:{user_id}")]
+        if not conv_ids:
+            return []
+
+        # Meta + dernier echange de toutes les conversations en un seul
+        # aller-retour ; LINDEX -1 evite de rapatrier l'historique complet
+        pipe = self.redis.pipeline(transaction=False)
         for conv_id in conv_ids:
-                      meta_data = await self.redis.get(f"conv_meta:{conv_id}")
-                      history_data = await self.redis.get(f"conv:{conv_id}")
-                      if meta_data and history_data:
-                                        try:
-                                                              meta = json.loads(meta_data)
-                                                              history = json.loads(history_data)
-                                                              conversations.append({
-                                                                  "conversation_id": conv_id,
-                                                                  "message_count": len(history),
-                                                                  "last_message": history[-1].get("question", "")[:80] if history else "",
-                                                                  "started_at": meta.get("started_at", ""),
-                                                                  "last_activity": meta.get("last_activity", ""),
-                                                              })
-except Exception:
+            pipe.hgetall(f"conv_meta:{conv_id}")
+            pipe.llen(f"conv:{conv_id}")
+            pipe.lindex(f"conv:{conv_id}", -1)
+        results = await pipe.execute()
+
+        conversations = []
+        for i, conv_id in enumerate(conv_ids):
+            raw_meta = results[3 * i]
+            count = results[3 * i + 1]
+            last = results[3 * i + 2]
+            if raw_meta and last:
+                try:
+                    meta = {k.decode(): v.decode() for k, v in raw_meta.items()}
+                    last_exchange = self._dec.decode(last)
+                    conversations.append({
+                        "conversation_id": conv_id,
+                        "message_count": count,
+                        "last_message": last_exchange.get("question", "")[:80],
+                        "started_at": meta.get("started_at", ""),
+                        "last_activity": meta.get("last_activity", ""),
+                    })
+                except Exception:
                     continue
 
         conversations.sort(key=lambda x: x.get("last_activity", ""), reverse=True)
         return conversations
 
     async def delete_conversation(self, conversation_id: str, user_id: str):
-              """Supprime une conversation."""
+        """Supprime une conversation."""
         await self.redis.delete(f"conv:{conversation_id}")
         await self.redis.delete(f"conv_meta:{conversation_id}")
+        await self.redis.zrem("conv:by_activity", conversation_id)
         await self.redis.srem(f"user_convs:{user_id}", conversation_id)
 
     async def clear_all_user_conversations(self, user_id: str):
-              """Supprime toutes les conversations d'un utilisateur."""
-        conv_ids = await self.redis.smembers(f"user_convs:{user_id}")
-        for conv_id in conv_ids:
-                      await self.delete_conversation(conv_id, user_id)
+        """Supprime toutes les conversations d'un utilisateur."""
+        conv_ids = [c.decode() for c in await self.redis.smembers(f"user_convs:{user_id}")]
+        if not conv_ids:
+            return
+        # Un seul pipeline au lieu de 4 commandes par conversation
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(*(f"conv:{c}" for c in conv_ids))
+        pipe.delete(*(f"conv_meta:{c}" for c in conv_ids))
+        pipe.zrem("conv:by_activity", *conv_ids)
+        pipe.srem(f"user_convs:{user_id}", *conv_ids)
+        await pipe.execute()
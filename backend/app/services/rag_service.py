@@ -1,15 +1,20 @@
 """
 Service RAG principal - Logique de retrieval et generation
 """
+import asyncio
+import hashlib
 import json
+import re
 import time
 import uuid
 from typing import AsyncGenerator, Optional
 
 import structlog
+from cachetools import TTLCache
 from langchain_community.vectorstores import Qdrant
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from langchain_core.documents import Document
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import Filter, FieldCondition, MatchValue, QueryRequest
 
 from app.core.config import settings
 from app.services.llm_service import LLMService
@@ -19,6 +24,83 @@ from app.services.stats_service import StatsService
 
 logger = structlog.get_logger()
 
+# References fortes vers les taches de persistance en arriere-plan
+# (sans elles, le GC peut annuler une tache en cours)
+_background_tasks: set = set()
+
+
+def _spawn(coro) -> None:
+    """Lance une coroutine en tache de fond, hors chemin de la reponse."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# Clients Qdrant partages par le process : toutes les instances de
+# RAGService (API chat, serveur MCP) reutilisent les memes connexions
+# au lieu de repayer le handshake a chaque construction
+_qdrant_client: Optional[QdrantClient] = None
+_qdrant_async_client: Optional[AsyncQdrantClient] = None
+
+# Qdrant sature autour de deux recherches paralleles par worker :
+# au-dela, les requetes font la queue cote serveur sans gain de debit
+_retrieval_sem = asyncio.Semaphore(2)
+
+
+def _get_qdrant() -> QdrantClient:
+    """Client Qdrant synchrone partage (vectorstore, scripts)."""
+    global _qdrant_client
+    if _qdrant_client is None:
+        _qdrant_client = QdrantClient(
+            host=settings.QDRANT_HOST,
+            port=settings.QDRANT_PORT
+        )
+    return _qdrant_client
+
+
+def _get_qdrant_async() -> AsyncQdrantClient:
+    """
+    Client Qdrant asynchrone partage pour les handlers FastAPI.
+
+    prefer_grpc : le canal gRPC (port 6334) evite le framing HTTP et le
+    parsing JSON de l'API REST sur le chemin de recherche ; le client
+    retombe sur REST si le port gRPC est ferme.
+    """
+    global _qdrant_async_client
+    if _qdrant_async_client is None:
+        _qdrant_async_client = AsyncQdrantClient(
+            host=settings.QDRANT_HOST,
+            port=settings.QDRANT_PORT,
+            grpc_port=6334,
+            prefer_grpc=True,
+        )
+    return _qdrant_async_client
+
+
+def close_clients() -> None:
+    """
+    Ferme les clients Qdrant partages du process (hook d'arret).
+
+    Le client async se ferme via une coroutine ; a l'arret du process il
+    n'y a plus d'event loop, on lache simplement la reference et le canal
+    gRPC tombe avec le process.
+    """
+    global _qdrant_client, _qdrant_async_client
+    if _qdrant_client is not None:
+        _qdrant_client.close()
+        _qdrant_client = None
+    _qdrant_async_client = None
+
+
+# Detecteur de reponses evasives precompile : un seul scan lineaire de
+# la reponse au lieu d'une recherche de sous-chaine par phrase
+_LOW_CONFIDENCE_RE = re.compile("|".join(map(re.escape, (
+    "je ne trouve pas",
+    "pas dans la documentation",
+    "je n'ai pas d'information",
+    "aucun document",
+))))
+
 SYSTEM_PROMPT = """Tu es un expert metier senior avec acces a la documentation complete de l'entreprise.
 
 REGLES STRICTES :
@@ -33,49 +115,78 @@ REGLES STRICTES :
 
 
 class RAGService:
-      """Service principal pour le chatbot RAG."""
+    """Service principal pour le chatbot RAG."""
 
     def __init__(self):
-              self.llm_service = LLMService()
-              self.memory_service = MemoryService()
-              self.cache_service = CacheService()
-              self.stats_service = StatsService()
-              self._vectorstore = None
+        self.llm_service = LLMService()
+        self.memory_service = MemoryService()
+        self.cache_service = CacheService()
+        self.stats_service = StatsService()
+        self._vectorstore = None
+        # L1 en memoire process devant le cache Redis : une question qui
+        # tourne en boucle ne paie meme plus le RTT Redis
+        self._l1: TTLCache = TTLCache(maxsize=2048, ttl=300)
+
+    @property
+    def qdrant_client(self) -> QdrantClient:
+        """Client Qdrant synchrone partage du process."""
+        return _get_qdrant()
+
+    @property
+    def qdrant_async_client(self) -> AsyncQdrantClient:
+        """Client Qdrant asynchrone partage du process."""
+        return _get_qdrant_async()
 
     @property
     def vectorstore(self) -> Qdrant:
-              if self._vectorstore is None:
-                            client = QdrantClient(
-                                              host=settings.QDRANT_HOST,
-                                              port=settings.QDRANT_PORT
-                            )
-                            self._vectorstore = Qdrant(
-                                client=client,
-                                collection_name=settings.COLLECTION_NAME,
-                                embeddings=self.llm_service.embeddings,
-                            )
-                        return self._vectorstore
+        if self._vectorstore is None:
+            self._vectorstore = Qdrant(
+                client=self.qdrant_client,
+                collection_name=settings.COLLECTION_NAME,
+                embeddings=self.llm_service.embeddings,
+            )
+        return self._vectorstore
+
+    @staticmethod
+    def _chat_cache_key(message: str, department_filter: Optional[str]) -> str:
+        """
+        Cle de cache stable inter-workers pour une question.
+
+        hash() de Python est randomise par process (PYTHONHASHSEED) :
+        deux workers uvicorn ne partageaient jamais une entree. blake2b
+        est deterministe, et la normalisation casse/espaces regroupe les
+        quasi-doublons sous la meme cle.
+        """
+        normalized = " ".join(message.lower().split())
+        digest = hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+        return f"chat:{digest}:{department_filter or '_'}"
 
     async def chat(
-              self,
-              message: str,
-              conversation_id: Optional[str] = None,
-              user_id: str = "anonymous",
-              department_filter: Optional[str] = None,
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        user_id: str = "anonymous",
+        department_filter: Optional[str] = None,
     ) -> dict:
-              """Traitement d'un message utilisateur - retourne une reponse complete."""
+        """Traitement d'un message utilisateur - retourne une reponse complete."""
         start_time = time.time()
         conv_id = conversation_id or str(uuid.uuid4())
 
-        cache_key = f"chat:{hash(message)}:{department_filter}"
+        cache_key = self._chat_cache_key(message, department_filter)
+        if (hot := self._l1.get(cache_key)) is not None:
+            return {**hot, "conversation_id": conv_id, "cached": True}
         if cached := await self.cache_service.get(cache_key):
-                      logger.info("Cache hit", key=cache_key)
-                      return {**json.loads(cached), "conversation_id": conv_id, "cached": True}
+            logger.info("Cache hit", key=cache_key)
+            data = json.loads(cached)
+            self._l1[cache_key] = data
+            return {**data, "conversation_id": conv_id, "cached": True}
 
         history = await self.memory_service.get_history(conv_id)
         contextualized_q = await self._contextualize_query(message, history)
 
-        docs = await self._retrieve_documents(contextualized_q, department_filter)
+        docs = await self._retrieve_documents(
+            contextualized_q, department_filter, original_query=message
+        )
 
         context = self._build_context(docs)
         sources = self._extract_sources(docs)
@@ -84,53 +195,83 @@ class RAGService:
         answer = await self.llm_service.generate(full_prompt)
 
         confidence = self._assess_confidence(answer, docs)
-
-        await self.memory_service.save_exchange(conv_id, message, answer, sources)
-
         response_time = (time.time() - start_time) * 1000
-        await self.stats_service.track(
-                      user_id=user_id,
-                      question=message,
-                      answer=answer,
-                      sources=sources,
-                      confidence=confidence,
-                      response_time_ms=response_time
-        )
 
         result = {
-                      "answer": answer,
-                      "sources": sources,
-                      "confidence": confidence,
-                      "conversation_id": conv_id,
-                      "response_time_ms": round(response_time, 2),
-                      "cached": False,
+            "answer": answer,
+            "sources": sources,
+            "confidence": confidence,
+            "conversation_id": conv_id,
+            "response_time_ms": round(response_time, 2),
+            "cached": False,
         }
 
-        await self.cache_service.set(cache_key, json.dumps(result), ttl=1800)
+        # Memoire, stats et cache n'influencent pas la reponse : ils
+        # partent en tache de fond, la reponse part tout de suite
+        self._l1[cache_key] = result
+        _spawn(self._post_chat_work(
+            conv_id, message, answer, sources, confidence,
+            response_time, user_id, cache_key, result,
+        ))
         return result
 
+    async def _post_chat_work(
+        self,
+        conv_id: str,
+        message: str,
+        answer: str,
+        sources: list,
+        confidence: str,
+        response_time: float,
+        user_id: str,
+        cache_key: str,
+        result: dict,
+    ) -> None:
+        """Persistance post-reponse : memoire, stats et cache en parallele."""
+        try:
+            await asyncio.gather(
+                self.memory_service.save_exchange(conv_id, message, answer, sources),
+                self.stats_service.track(
+                    user_id=user_id,
+                    question=message,
+                    answer=answer,
+                    sources=sources,
+                    confidence=confidence,
+                    response_time_ms=response_time,
+                ),
+                self.cache_service.set(cache_key, json.dumps(result), ttl=1800),
+            )
+        except Exception as e:
+            logger.warning("Echec persistance post-chat", error=str(e))
+
     async def chat_stream(
-              self,
-              message: str,
-              conversation_id: Optional[str] = None,
-              user_id: str = "anonymous",
-              department_filter: Optional[str] = None,
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        user_id: str = "anonymous",
+        department_filter: Optional[str] = None,
     ) -> AsyncGenerator[dict, None]:
-              """Chatbot avec streaming token par token."""
-              conv_id = conversation_id or str(uuid.uuid4())
+        """Chatbot avec streaming token par token."""
+        start_time = time.time()
+        conv_id = conversation_id or str(uuid.uuid4())
 
         yield {"type": "conv_id", "data": conv_id}
 
         history = await self.memory_service.get_history(conv_id)
         contextualized_q = await self._contextualize_query(message, history)
-        docs = await self._retrieve_documents(contextualized_q, department_filter)
+        docs = await self._retrieve_documents(
+            contextualized_q, department_filter, original_query=message
+        )
         context = self._build_context(docs)
         full_prompt = self._build_prompt(message, context, history)
 
-        full_answer = ""
+        # Accumulation en liste + join final : la concatenation str par
+        # token recopie toute la reponse a chaque chunk (cout quadratique)
+        buf: list[str] = []
         async for token in self.llm_service.stream(full_prompt):
-                      full_answer += token
-                      yield {"type": "token", "data": token}
+            buf.append(token)
+            yield {"type": "token", "data": token}
+        full_answer = "".join(buf)
 
         sources = self._extract_sources(docs)
         confidence = self._assess_confidence(full_answer, docs)
@@ -139,95 +280,166 @@ class RAGService:
         yield {"type": "confidence", "data": confidence}
         yield {"type": "done", "data": True}
 
-        await self.memory_service.save_exchange(conv_id, message, full_answer, sources)
-
-    async def _retrieve_documents(self, query: str, department: Optional[str] = None):
-              """Recherche hybride dans Qdrant."""
-              search_kwargs = {"k": settings.TOP_K_RESULTS}
-
+        # Meme cle que chat() : la reponse streamee alimente aussi le
+        # cache du chemin non-streaming. Persistance en tache de fond,
+        # le flux SSE est deja clos pour le client.
+        cache_key = self._chat_cache_key(message, department_filter)
+        result = {
+            "answer": full_answer,
+            "sources": sources,
+            "confidence": confidence,
+            "response_time_ms": round((time.time() - start_time) * 1000, 2),
+            "cached": False,
+        }
+        self._l1[cache_key] = result
+
+        async def _persist() -> None:
+            try:
+                await asyncio.gather(
+                    self.memory_service.save_exchange(conv_id, message, full_answer, sources),
+                    self.cache_service.set(cache_key, json.dumps(result), ttl=1800),
+                )
+            except Exception as e:
+                logger.warning("Echec persistance post-stream", error=str(e))
+
+        _spawn(_persist())
+
+    async def _retrieve_documents(
+        self,
+        query: str,
+        department: Optional[str] = None,
+        original_query: Optional[str] = None,
+    ):
+        """
+        Recherche dans Qdrant, en batch sur les deux formulations.
+
+        La reformulation LLM ameliore le rappel mais derive parfois de
+        l'intention initiale : interroger aussi la question d'origine
+        recupere ces cas, et query_batch_points fusionne les deux
+        recherches dans le meme aller-retour serveur.
+        """
+        queries = [query]
+        if original_query and original_query != query:
+            queries.append(original_query)
+
+        q_filter = None
         if department:
-                      search_kwargs["filter"] = Filter(
-                                        must=[FieldCondition(
-                                                              key="department",
-                                                              match=MatchValue(value=department)
-                                        )]
-                      )
+            q_filter = Filter(
+                must=[FieldCondition(
+                    key="department",
+                    match=MatchValue(value=department)
+                )]
+            )
+
+        # Un seul appel d'embedding pour toutes les formulations, en
+        # version async : l'event loop reste libre pendant l'attente
+        vectors = await self.llm_service.embeddings.aembed_documents(queries)
+        async with _retrieval_sem:
+            responses = await self.qdrant_async_client.query_batch_points(
+                collection_name=settings.COLLECTION_NAME,
+                requests=[
+                    QueryRequest(
+                        query=vector,
+                        filter=q_filter,
+                        limit=settings.TOP_K_RESULTS,
+                        with_payload=True,
+                    )
+                    for vector in vectors
+                ],
+            )
+
+        return self._points_to_documents(
+            point for response in responses for point in response.points
+        )
 
-        retriever = self.vectorstore.as_retriever(search_kwargs=search_kwargs)
-        return retriever.get_relevant_documents(query)
+    @staticmethod
+    def _points_to_documents(points) -> list:
+        """Fusionne des points Qdrant en documents dedupliques par id."""
+        seen = set()
+        docs = []
+        for point in sorted(points, key=lambda p: p.score, reverse=True):
+            if point.id in seen:
+                continue
+            seen.add(point.id)
+            payload = point.payload or {}
+            docs.append(Document(
+                page_content=payload.get("page_content", ""),
+                metadata=payload.get("metadata") or {},
+            ))
+            if len(docs) >= settings.TOP_K_RESULTS:
+                break
+        return docs
 
     def _build_context(self, docs) -> str:
-              """Construit le contexte documentaire."""
-              parts = []
-              for doc in docs:
-                            source = doc.metadata.get("source_file", "Document inconnu")
-                            parts.append(f"[Source: {source}]\n{doc.page_content}")
-                        return "\n\n---\n\n".join(parts)
+        """Construit le contexte documentaire."""
+        # Une seule comprehension, metadata lu une fois par document
+        return "\n\n---\n\n".join(
+            "[Source: %s]\n%s" % (
+                doc.metadata.get("source_file", "Document inconnu"),
+                doc.page_content,
+            )
+            for doc in docs
+        )
 
     def _extract_sources(self, docs) -> list:
-              """Extrait les sources uniques des documents retrouves."""
+        """Extrait les sources uniques des documents retrouves."""
         seen = set()
         sources = []
         for doc in docs:
-                      filename = doc.metadata.get("source_file", "")
-                      if filename and filename not in seen:
-                                        seen.add(filename)
-                                        sources.append({
-                                            "file": filename,
-                                            "path": doc.metadata.get("source_path", ""),
-                                            "category": doc.metadata.get("category", ""),
-                                            "department": doc.metadata.get("department", ""),
-                                        })
-                                return sources
+            meta = doc.metadata
+            filename = meta.get("source_file", "")
+            if filename and filename not in seen:
+                seen.add(filename)
+                sources.append({
+                    "file": filename,
+                    "path": meta.get("source_path", ""),
+                    "category": meta.get("category", ""),
+                    "department": meta.get("department", ""),
+                })
+        return sources
 
     def _build_prompt(self, question: str, context: str, history: list) -> list:
-              """Construit le prompt complet avec historique."""
+        """Construit le prompt complet avec historique."""
         messages = [{"role": "system", "content": SYSTEM_PROMPT}]
 
         for exchange in history[-settings.CONVERSATION_HISTORY_LENGTH:]:
-                      messages.append({"role": "user", "content": exchange["question"]})
+            messages.append({"role": "user", "content": exchange["question"]})
             messages.append({"role": "assistant", "content": exchange["answer"]})
 
         user_content = f"""CONTEXTE DOCUMENTAIRE :
-        {context}
+{context}
 
-        QUESTION : {question}
+QUESTION : {question}
 
-        REPONSE EXPERTE :"""
+REPONSE EXPERTE :"""
 
         messages.append({"role": "user", "content": user_content})
         return messages
 
     async def _contextualize_query(self, question: str, history: list) -> str:
-              """Reformule la question en tenant compte de l'historique."""
+        """Reformule la question en tenant compte de l'historique."""
         if not history:
-                      return question
+            return question
 
         history_text = "\n".join([
-                      f"User: {h['question']}\nAssistant: {h['answer'][:200]}..."
-                      for h in history[-3:]
+            f"User: {h['question']}\nAssistant: {h['answer'][:200]}..."
+            for h in history[-3:]
         ])
 
         prompt = f"""Historique de conversation :
-        {history_text}
+{history_text}
 
-        Question actuelle : {question}
+Question actuelle : {question}
 
-        Si la question fait reference a quelque chose de l'historique, reformule-la de facon autonome.
-        Sinon, retourne la question telle quelle. Reformulation :"""
+Si la question fait reference a quelque chose de l'historique, reformule-la de facon autonome.
+Sinon, retourne la question telle quelle. Reformulation :"""
 
         return await self.llm_service.generate_simple(prompt)
 
     def _assess_confidence(self, answer: str, docs: list) -> str:
-              """Evalue le niveau de confiance de la reponse."""
-        low_confidence_phrases = [
-                      "je ne trouve pas",
-                      "pas dans la documentation",
-                      "je n'ai pas d'information",
-                      "aucun document"
-        ]
-        if any(phrase in answer.lower() for phrase in low_confidence_phrases):
-                      return "low"
+        """Evalue le niveau de confiance de la reponse."""
+        if _LOW_CONFIDENCE_RE.search(answer.casefold()):
+            return "low"
         if len(docs) >= 4:
-                      return "high"
+            return "high"
         return "medium"
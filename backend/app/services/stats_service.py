@@ -4,13 +4,17 @@ Enregistre les conversations, messages, feedbacks et temps de reponse.
 Stocke dans PostgreSQL via SQLAlchemy ou dans Redis.
 """
 
+import asyncio
 import json
 import logging
+import time
 from datetime import datetime, timezone, timedelta
 from typing import Any, Optional
 from collections import defaultdict
 
 import redis.asyncio as aioredis
+from cachetools import TTLCache
+from app.core.redis import get_redis
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy import String, Integer, Float, DateTime, Text, select, func
@@ -24,11 +28,11 @@ logger = logging.getLogger(__name__)
 # ─── Modeles SQLAlchemy ────────────────────────────────────────────────────
 
 class Base(DeclarativeBase):
-      pass
+    pass
 
 
 class ConversationRecord(Base):
-      __tablename__ = "conversations"
+    __tablename__ = "conversations"
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     user_id: Mapped[str] = mapped_column(String(255), index=True)
@@ -40,7 +44,7 @@ class ConversationRecord(Base):
 
 
 class MessageRecord(Base):
-      __tablename__ = "messages"
+    __tablename__ = "messages"
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     conversation_id: Mapped[str] = mapped_column(String(36), index=True)
@@ -56,271 +60,386 @@ class MessageRecord(Base):
 # ─── Service Stats ─────────────────────────────────────────────────────────
 
 class StatsService:
-      """
-          Service centralise pour les statistiques du chatbot.
-              - Enregistre chaque echange dans PostgreSQL
-                  - Maintient des compteurs en temps reel dans Redis
-                      - Fournit des agregations pour le dashboard admin
-                          """
+    """
+    Service centralise pour les statistiques du chatbot.
+    - Enregistre chaque echange dans PostgreSQL
+    - Maintient des compteurs en temps reel dans Redis
+    - Fournit des agregations pour le dashboard admin
+    """
 
     def __init__(self):
-              self._engine = None
-              self._redis: aioredis.Redis | None = None
+        self._engine = None
+        self._redis: aioredis.Redis | None = None
+        # Le dashboard se rafraichit en boucle : 10 s de memoire process
+        # suffisent a absorber le polling sans toucher Redis ni PostgreSQL
+        self._dash_mem: TTLCache = TTLCache(maxsize=1, ttl=10)
+        # File des messages a persister : record_message y depose et
+        # rend la main, _flush_loop insere par lots en arriere-plan
+        self._msg_queue: asyncio.Queue = asyncio.Queue()
+        self._flush_task: asyncio.Task | None = None
 
     async def _get_engine(self):
-              """Initialise le moteur SQLAlchemy de maniere paresseuse."""
-              if self._engine is None:
-                            self._engine = create_async_engine(
-                                              settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
-                                              pool_size=10,
-                                              max_overflow=20,
-                                              echo=False,
-                            )
-                            async with self._engine.begin() as conn:
-                                              await conn.run_sync(Base.metadata.create_all)
-                                      return self._engine
-
-          async def _get_redis(self) -> aioredis.Redis:
-                    """Initialise le client Redis de maniere paresseuse."""
-                    if self._redis is None:
-                                  self._redis = aioredis.from_url(
-                                                    settings.REDIS_URL,
-                                                    encoding="utf-8",
-                                                    decode_responses=True,
-                                  )
-                              return self._redis
+        """Initialise le moteur SQLAlchemy de maniere paresseuse."""
+        if self._engine is None:
+            self._engine = create_async_engine(
+                settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+                pool_size=10,
+                max_overflow=20,
+                echo=False,
+            )
+            async with self._engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        return self._engine
+
+    async def _get_redis(self) -> aioredis.Redis:
+        """Initialise le client Redis de maniere paresseuse."""
+        if self._redis is None:
+            # Pool texte partage du process (health-check et keepalive
+            # configures en un seul endroit, voir app.core.redis)
+            self._redis = get_redis()
+        return self._redis
+
+    async def track(
+        self,
+        user_id: str,
+        question: str,
+        answer: str,
+        sources: list,
+        confidence: str,
+        response_time_ms: float,
+    ) -> None:
+        """
+        Enregistre une requete chatbot dans Redis et precompute les
+        agregats du dashboard (compteurs par jour, top questions/sources).
+        Tout part dans un seul pipeline : une seule RTT Redis par requete.
+        """
+        try:
+            redis = await self._get_redis()
+            entry = {
+                "user_id": user_id,
+                "question": question,
+                "answer": answer[:500],
+                "sources": sources,
+                "confidence": confidence,
+                "response_time_ms": round(response_time_ms, 1),
+                "timestamp": time.time(),
+            }
+            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+            pipe = redis.pipeline(transaction=False)
+            pipe.lpush("stats:queries", json.dumps(entry, ensure_ascii=False))
+            pipe.ltrim("stats:queries", 0, 999)
+            pipe.incr("stats:total_queries")
+            pipe.incr(f"stats:user:{user_id}:query_count")
+            # Agregats precomputes lus par /admin/stats (evite de re-scanner
+            # les 1000 dernieres requetes a chaque affichage du dashboard)
+            pipe.incr(f"stats:queries:by_day:{today}")
+            pipe.expire(f"stats:queries:by_day:{today}", 35 * 86400)
+            # Sorted sets : le top-K se lit ensuite en ZREVRANGE sans tri Python
+            pipe.zincrby("stats:zset:questions", 1, question[:100])
+            for source in sources:
+                if isinstance(source, dict) and source.get("file"):
+                    pipe.zincrby("stats:zset:sources", 1, source["file"])
+            pipe.hincrby("stats:confidence", confidence or "unknown", 1)
+            await pipe.execute()
+
+        except Exception as e:
+            logger.error(f"Erreur track requete: {e}")
 
     async def record_conversation(
-              self,
-              conversation_id: str,
-              user_id: str,
-              user_name: str = "",
+        self,
+        conversation_id: str,
+        user_id: str,
+        user_name: str = "",
     ) -> None:
-              """Enregistre une nouvelle conversation."""
+        """Enregistre une nouvelle conversation."""
         try:
-                      engine = await self._get_engine()
-                      async with AsyncSession(engine) as session:
-                                        existing = await session.get(ConversationRecord, conversation_id)
-                                        if not existing:
-                                                              record = ConversationRecord(
-                                                                                        id=conversation_id,
-                                                                                        user_id=user_id,
-                                                                                        user_name=user_name,
-                                                              )
-                                                              session.add(record)
-                                                              await session.commit()
-
-                                    # Incrementer le compteur Redis
-                                    redis = await self._get_redis()
+            engine = await self._get_engine()
+            async with AsyncSession(engine) as session:
+                existing = await session.get(ConversationRecord, conversation_id)
+                if not existing:
+                    record = ConversationRecord(
+                        id=conversation_id,
+                        user_id=user_id,
+                        user_name=user_name,
+                    )
+                    session.add(record)
+                    await session.commit()
+
+            # Compteurs Redis : un seul aller-retour pour les trois
+            redis = await self._get_redis()
             today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-            await redis.incr(f"stats:conversations:total")
-            await redis.incr(f"stats:conversations:day:{today}")
-            await redis.sadd(f"stats:active_users:{today}", user_id)
+            pipe = redis.pipeline(transaction=False)
+            pipe.incr("stats:conversations:total")
+            pipe.incr(f"stats:conversations:day:{today}")
+            pipe.sadd(f"stats:active_users:{today}", user_id)
+            await pipe.execute()
 
-except Exception as e:
+        except Exception as e:
             logger.error(f"Erreur enregistrement conversation: {e}")
 
     async def record_message(
-              self,
-              message_id: str,
-              conversation_id: str,
-              user_id: str,
-              role: str,
-              content: str,
-              response_time_ms: Optional[float] = None,
-              sources_count: int = 0,
+        self,
+        message_id: str,
+        conversation_id: str,
+        user_id: str,
+        role: str,
+        content: str,
+        response_time_ms: Optional[float] = None,
+        sources_count: int = 0,
     ) -> None:
-              """Enregistre un message et met a jour les statistiques."""
+        """Enregistre un message et met a jour les statistiques."""
         try:
-                      engine = await self._get_engine()
-            async with AsyncSession(engine) as session:
-                              # Enregistrer le message
-                              record = MessageRecord(
-                                                    id=message_id,
-                                                    conversation_id=conversation_id,
-                                                    user_id=user_id,
-                                                    role=role,
-                                                    content=content[:2000],  # Tronquer pour la base
-                                                    response_time_ms=response_time_ms,
-                                                    sources_count=sources_count,
-                              )
-                              session.add(record)
-
-                # Mettre a jour le compteur de la conversation
-                              conv = await session.get(ConversationRecord, conversation_id)
-                if conv:
-                                      conv.message_count += 1
-                                      conv.last_activity = datetime.now(timezone.utc)
-
-                await session.commit()
-
-            # Metriques Redis temps reel
+            # L'INSERT part dans la file du batcher : la latence
+            # PostgreSQL sort du chemin critique de la requete
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_loop())
+            self._msg_queue.put_nowait({
+                "id": message_id,
+                "conversation_id": conversation_id,
+                "user_id": user_id,
+                "role": role,
+                "content": content[:2000],  # Tronquer pour la base
+                "response_time_ms": response_time_ms,
+                "sources_count": sources_count,
+            })
+
+            # Metriques Redis temps reel : toutes les commandes partent
+            # dans un meme pipeline (1 RTT au lieu de 2 a 5)
             redis = await self._get_redis()
-            hour_key = datetime.now(timezone.utc).strftime("%Y-%m-%d:%H")
+            now = datetime.now(timezone.utc)
+            today = now.strftime("%Y-%m-%d")
+            hour_str = now.strftime("%H")
 
-            await redis.incr(f"stats:messages:total")
-            await redis.incr(f"stats:messages:hour:{hour_key}")
+            pipe = redis.pipeline(transaction=False)
+            pipe.incr("stats:messages:total")
+            # Agregats horaires en hash (un champ par heure de la journee) :
+            # le dashboard relit les 24 points en un HGETALL par jour
+            pipe.hincrby(f"stats:hourly_msgs:{today}", hour_str, 1)
+            pipe.expire(f"stats:hourly_msgs:{today}", 3 * 86400)
 
             if response_time_ms and role == "assistant":
-                              # Temps de reponse moyen par heure (liste glissante)
-                              await redis.lpush(f"stats:response_times:{hour_key}", response_time_ms)
-                              await redis.ltrim(f"stats:response_times:{hour_key}", 0, 999)
+                # Moyenne horaire en somme + compteur (pas de liste a re-scanner)
+                pipe.hincrbyfloat(f"stats:hourly_rt_sum:{today}", hour_str, response_time_ms)
+                pipe.hincrby(f"stats:hourly_rt_cnt:{today}", hour_str, 1)
+                pipe.expire(f"stats:hourly_rt_sum:{today}", 3 * 86400)
+                pipe.expire(f"stats:hourly_rt_cnt:{today}", 3 * 86400)
 
             # Top requetes (pour les messages utilisateur)
             if role == "user" and content:
-                              query_key = content[:100].strip()
-                              await redis.zincrby("stats:top_queries", 1, query_key)
+                query_key = content[:100].strip()
+                pipe.zincrby("stats:top_queries", 1, query_key)
+
+            await pipe.execute()
 
-except Exception as e:
+        except Exception as e:
             logger.error(f"Erreur enregistrement message: {e}")
 
+    async def _flush_loop(self) -> None:
+        """Draine la file des messages et insere par lots."""
+        while True:
+            # Bloque sur le premier message, puis complete le lot
+            # pendant 100 ms maximum ou jusqu'a 50 lignes
+            rows = [await self._msg_queue.get()]
+            deadline = time.monotonic() + 0.1
+            while len(rows) < 50:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(self._msg_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush_messages(rows)
+            except Exception as e:
+                logger.error(f"Erreur flush messages: {e}")
+
+    async def _flush_messages(self, rows: list[dict]) -> None:
+        """INSERT multi-lignes + compteurs de conversation, un seul commit."""
+        engine = await self._get_engine()
+        now = datetime.now(timezone.utc)
+
+        # Compteurs agreges par conversation sur le lot
+        deltas: dict[str, int] = {}
+        for row in rows:
+            deltas[row["conversation_id"]] = deltas.get(row["conversation_id"], 0) + 1
+
+        async with AsyncSession(engine) as session:
+            await session.execute(sa.insert(MessageRecord), rows)
+            for conv_id, delta in deltas.items():
+                await session.execute(
+                    sa.update(ConversationRecord)
+                    .where(ConversationRecord.id == conv_id)
+                    .values(
+                        message_count=ConversationRecord.message_count + delta,
+                        last_activity=now,
+                    )
+                )
+            await session.commit()
+
     async def record_feedback(
-              self,
-              conversation_id: str,
-              message_id: Optional[str],
-              feedback: str,
+        self,
+        conversation_id: str,
+        message_id: Optional[str],
+        feedback: str,
     ) -> None:
-              """Enregistre le feedback utilisateur (positive/negative)."""
+        """Enregistre le feedback utilisateur (positive/negative)."""
         try:
-                      engine = await self._get_engine()
+            engine = await self._get_engine()
             async with AsyncSession(engine) as session:
-                              if message_id:
-                                                    msg = await session.get(MessageRecord, message_id)
-                                                    if msg:
-                                                                              msg.feedback = feedback
-
-                                                conv = await session.get(ConversationRecord, conversation_id)
-                if conv:
-                                      conv.feedback = feedback
-
+                # UPDATEs directs : pas de SELECT prealable par ligne
+                if message_id:
+                    await session.execute(
+                        sa.update(MessageRecord)
+                        .where(MessageRecord.id == message_id)
+                        .values(feedback=feedback)
+                    )
+                await session.execute(
+                    sa.update(ConversationRecord)
+                    .where(ConversationRecord.id == conversation_id)
+                    .values(feedback=feedback)
+                )
                 await session.commit()
 
-            # Compteurs Redis
+            # Compteurs Redis ; le feedback doit transparaitre au prochain
+            # affichage, on invalide la copie process du dashboard
+            self._dash_mem.clear()
             redis = await self._get_redis()
             await redis.incr(f"stats:feedback:{feedback}")
 
-except Exception as e:
+        except Exception as e:
             logger.error(f"Erreur enregistrement feedback: {e}")
 
     async def get_dashboard_stats(self) -> dict[str, Any]:
-              """
-                      Retourne les statistiques completes pour le dashboard admin.
-                              Combine PostgreSQL (historique) et Redis (temps reel).
-                                      """
+        """
+        Retourne les statistiques completes pour le dashboard admin.
+        Combine PostgreSQL (historique) et Redis (temps reel).
+        """
+        cached = self._dash_mem.get("dashboard")
+        if cached is not None:
+            return cached
+
         try:
-                      redis = await self._get_redis()
+            redis = await self._get_redis()
             engine = await self._get_engine()
 
-            # Stats globales Redis
-            total_conversations = int(await redis.get("stats:conversations:total") or 0)
-            total_messages = int(await redis.get("stats:messages:total") or 0)
-            feedback_positive = int(await redis.get("stats:feedback:positive") or 0)
-            feedback_negative = int(await redis.get("stats:feedback:negative") or 0)
+            now = datetime.now(timezone.utc)
+            today = now.strftime("%Y-%m-%d")
+            yesterday = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+            hours = [now - timedelta(hours=23 - i) for i in range(24)]
+
+            # Toutes les lectures Redis du dashboard (scalaires, top
+            # requetes et les hashes horaires des deux graphes) en un
+            # seul pipeline : 1 RTT au lieu d'une cinquantaine
+            pipe = redis.pipeline(transaction=False)
+            pipe.get("stats:conversations:total")
+            pipe.get("stats:messages:total")
+            pipe.get("stats:feedback:positive")
+            pipe.get("stats:feedback:negative")
+            pipe.scard(f"stats:active_users:{today}")
+            pipe.get("stats:documents:total")
+            pipe.zrevrangebyscore(
+                "stats:top_queries",
+                "+inf", "-inf",
+                start=0, num=10,
+                withscores=True,
+            )
+            for day in (today, yesterday):
+                pipe.hgetall(f"stats:hourly_msgs:{day}")
+                pipe.hgetall(f"stats:hourly_rt_sum:{day}")
+                pipe.hgetall(f"stats:hourly_rt_cnt:{day}")
+            results = await pipe.execute()
+
+            total_conversations = int(results[0] or 0)
+            total_messages = int(results[1] or 0)
+            feedback_positive = int(results[2] or 0)
+            feedback_negative = int(results[3] or 0)
+            active_users_today = results[4]
+            total_docs = int(results[5] or 0)
+            top_queries = [
+                {"query": q, "count": int(score)}
+                for q, score in results[6]
+            ]
 
-            # Utilisateurs actifs aujourd'hui
-            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-            active_users_today = await redis.scard(f"stats:active_users:{today}")
+            # Temps de reponse et activite par heure : la fenetre de 24 h
+            # chevauche deux jours, on indexe chaque hash par sa date
+            hourly_msgs = {today: results[7], yesterday: results[10]}
+            hourly_rt_sum = {today: results[8], yesterday: results[11]}
+            hourly_rt_cnt = {today: results[9], yesterday: results[12]}
 
-            # Temps de reponse moyen (derniere heure)
-            current_hour = datetime.now(timezone.utc).strftime("%Y-%m-%d:%H")
-            response_times_raw = await redis.lrange(f"stats:response_times:{current_hour}", 0, -1)
-            avg_response_time = 0.0
-            if response_times_raw:
-                              times = [float(t) for t in response_times_raw]
-                avg_response_time = sum(times) / len(times)
+            response_times_chart = []
+            user_activity = []
+            for hour in hours:
+                day = hour.strftime("%Y-%m-%d")
+                field = hour.strftime("%H")
+                count = int(hourly_rt_cnt.get(day, {}).get(field) or 0)
+                total = float(hourly_rt_sum.get(day, {}).get(field) or 0.0)
+                response_times_chart.append({
+                    "hour": hour.strftime("%H:00"),
+                    "avg_ms": round(total / count, 1) if count else 0.0,
+                })
+                user_activity.append({
+                    "hour": hour.strftime("%H:00"),
+                    "users": int(hourly_msgs.get(day, {}).get(field) or 0),
+                })
+
+            # Temps de reponse moyen = heure courante (dernier point du graphe)
+            avg_response_time = response_times_chart[-1]["avg_ms"]
 
             # Conversations par jour (30 derniers jours depuis PostgreSQL)
             conversations_by_day = []
             async with AsyncSession(engine) as session:
-                              thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
+                thirty_days_ago = now - timedelta(days=30)
                 result = await session.execute(
-                                      select(
-                                                                func.date(ConversationRecord.created_at).label("date"),
-                                                                func.count(ConversationRecord.id).label("count"),
-                                      )
-                                      .where(ConversationRecord.created_at >= thirty_days_ago)
-                                      .group_by(func.date(ConversationRecord.created_at))
-                                      .order_by(func.date(ConversationRecord.created_at))
+                    select(
+                        func.date(ConversationRecord.created_at).label("date"),
+                        func.count(ConversationRecord.id).label("count"),
+                    )
+                    .where(ConversationRecord.created_at >= thirty_days_ago)
+                    .group_by(func.date(ConversationRecord.created_at))
+                    .order_by(func.date(ConversationRecord.created_at))
                 )
                 for row in result:
-                                      conversations_by_day.append({
-                                                                "date": str(row.date),
-                                                                "count": row.count,
-                                      })
-
-                # Total documents depuis Qdrant (approximation via Redis)
-                total_docs = int(await redis.get("stats:documents:total") or 0)
-
-            # Temps de reponse par heure (24 dernieres heures)
-            response_times_chart = []
-            for i in range(24):
-                              hour = (datetime.now(timezone.utc) - timedelta(hours=23 - i))
-                hour_key = hour.strftime("%Y-%m-%d:%H")
-                times_raw = await redis.lrange(f"stats:response_times:{hour_key}", 0, -1)
-                avg = 0.0
-                if times_raw:
-                                      times = [float(t) for t in times_raw]
-                                      avg = sum(times) / len(times)
-                                  response_times_chart.append({
-                                                        "hour": hour.strftime("%H:00"),
-                                                        "avg_ms": round(avg, 1),
-                                  })
-
-            # Top requetes (depuis Redis sorted set)
-            top_queries_raw = await redis.zrevrangebyscore(
-                              "stats:top_queries",
-                              "+inf", "-inf",
-                              start=0, num=10,
-                              withscores=True,
-            )
-            top_queries = [
-                              {"query": q, "count": int(score)}
-                              for q, score in top_queries_raw
-            ]
-
-            # Activite utilisateurs par heure
-            user_activity = []
-            for i in range(24):
-                              hour = (datetime.now(timezone.utc) - timedelta(hours=23 - i))
-                msg_key = hour.strftime("stats:messages:hour:%Y-%m-%d:%H")
-                count = int(await redis.get(msg_key) or 0)
-                user_activity.append({
-                                      "hour": hour.strftime("%H:00"),
-                                      "users": count,
-                })
-
-            return {
-                              "total_conversations": total_conversations,
-                              "total_messages": total_messages,
-                              "active_users_today": active_users_today,
-                              "avg_response_time_ms": round(avg_response_time, 1),
-                              "total_documents": total_docs,
-                              "feedback_positive": feedback_positive,
-                              "feedback_negative": feedback_negative,
-                              "conversations_by_day": conversations_by_day,
-                              "top_queries": top_queries,
-                              "response_times": response_times_chart,
-                              "user_activity": user_activity,
+                    conversations_by_day.append({
+                        "date": str(row.date),
+                        "count": row.count,
+                    })
+
+            stats = {
+                "total_conversations": total_conversations,
+                "total_messages": total_messages,
+                "active_users_today": active_users_today,
+                "avg_response_time_ms": round(avg_response_time, 1),
+                "total_documents": total_docs,
+                "feedback_positive": feedback_positive,
+                "feedback_negative": feedback_negative,
+                "conversations_by_day": conversations_by_day,
+                "top_queries": top_queries,
+                "response_times": response_times_chart,
+                "user_activity": user_activity,
             }
+            self._dash_mem["dashboard"] = stats
+            return stats
 
-except Exception as e:
+        except Exception as e:
             logger.error(f"Erreur get_dashboard_stats: {e}")
             return {
-                              "total_conversations": 0,
-                              "total_messages": 0,
-                              "active_users_today": 0,
-                              "avg_response_time_ms": 0.0,
-                              "total_documents": 0,
-                              "feedback_positive": 0,
-                              "feedback_negative": 0,
-                              "conversations_by_day": [],
-                              "top_queries": [],
-                              "response_times": [],
-                              "user_activity": [],
+                "total_conversations": 0,
+                "total_messages": 0,
+                "active_users_today": 0,
+                "avg_response_time_ms": 0.0,
+                "total_documents": 0,
+                "feedback_positive": 0,
+                "feedback_negative": 0,
+                "conversations_by_day": [],
+                "top_queries": [],
+                "response_times": [],
+                "user_activity": [],
             }
 
     async def increment_document_count(self, delta: int = 1) -> None:
-              """Met a jour le compteur de documents indexes."""
+        """Met a jour le compteur de documents indexes."""
         redis = await self._get_redis()
         await redis.incrby("stats:documents:total", delta)
 
@@ -330,8 +449,8 @@ _stats_service: StatsService | None = None
 
 
 def get_stats_service() -> StatsService:
-      """Dependency injection pour FastAPI."""
+    """Dependency injection pour FastAPI."""
     global _stats_service
     if _stats_service is None:
-              _stats_service = StatsService()
+        _stats_service = StatsService()
     return _stats_service
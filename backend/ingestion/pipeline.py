@@ -8,6 +8,7 @@ import time
 from pathlib import Path
 from typing import Optional
 
+import redis
 import structlog
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Qdrant
@@ -24,187 +25,216 @@ from app.core.config import settings
 logger = structlog.get_logger()
 
 SUPPORTED_FORMATS = [
-      ".pdf", ".docx", ".doc", ".xlsx", ".xls",
-      ".pptx", ".ppt", ".txt", ".md", ".html",
-      ".msg", ".eml", ".png", ".jpg", ".jpeg"
+    ".pdf", ".docx", ".doc", ".xlsx", ".xls",
+    ".pptx", ".ppt", ".txt", ".md", ".html",
+    ".msg", ".eml", ".png", ".jpg", ".jpeg"
 ]
 
 CATEGORY_KEYWORDS = {
-      "procedure": ["procedure", "process", "etape", "workflow", "instruction"],
-      "contrat": ["contrat", "contract", "accord", "convention", "avenant"],
-      "rh": ["ressources humaines", "rh", "conge", "paie", "recrutement", "formation"],
-      "technique": ["technique", "specification", "architecture", "api", "systeme"],
-      "finance": ["budget", "facture", "comptabilite", "finance", "devis", "tresorerie"],
-      "juridique": ["juridique", "legal", "reglementation", "conformite", "gdpr", "rgpd"],
-      "commercial": ["commercial", "client", "vente", "offre", "proposition"],
+    "procedure": ["procedure", "process", "etape", "workflow", "instruction"],
+    "contrat": ["contrat", "contract", "accord", "convention", "avenant"],
+    "rh": ["ressources humaines", "rh", "conge", "paie", "recrutement", "formation"],
+    "technique": ["technique", "specification", "architecture", "api", "systeme"],
+    "finance": ["budget", "facture", "comptabilite", "finance", "devis", "tresorerie"],
+    "juridique": ["juridique", "legal", "reglementation", "conformite", "gdpr", "rgpd"],
+    "commercial": ["commercial", "client", "vente", "offre", "proposition"],
 }
 
 
 class IngestionPipeline:
-      """Pipeline complet d'ingestion des documents."""
+    """Pipeline complet d'ingestion des documents."""
 
     def __init__(self):
-              self.llm_service = LLMService()
-              self.db = self._init_tracking_db()
-              self._vectorstore: Optional[Qdrant] = None
+        self.llm_service = LLMService()
+        self.db = self._init_tracking_db()
+        self._vectorstore: Optional[Qdrant] = None
+        self._redis: Optional[redis.Redis] = None
 
     def _init_tracking_db(self) -> sqlite3.Connection:
-              """Initialise la base SQLite de suivi des fichiers indexes."""
-              conn = sqlite3.connect("ingestion_tracker.db")
-              conn.execute("""
-                  CREATE TABLE IF NOT EXISTS indexed_files (
-                      filepath TEXT PRIMARY KEY,
-                      file_hash TEXT NOT NULL,
-                      indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      chunk_count INTEGER DEFAULT 0,
-                      status TEXT DEFAULT 'pending',
-                      error_message TEXT
-                  )
-              """)
-              conn.commit()
-              return conn
+        """Initialise la base SQLite de suivi des fichiers indexes."""
+        conn = sqlite3.connect("ingestion_tracker.db")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS indexed_files (
+                filepath TEXT PRIMARY KEY,
+                file_hash TEXT NOT NULL,
+                indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                chunk_count INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'pending',
+                error_message TEXT
+            )
+        """)
+        conn.commit()
+        return conn
 
     @property
     def vectorstore(self) -> Qdrant:
-              if self._vectorstore is None:
-                            client = QdrantClient(
-                                              host=settings.QDRANT_HOST,
-                                              port=settings.QDRANT_PORT
-                            )
-                            self._vectorstore = Qdrant(
-                                client=client,
-                                collection_name=settings.COLLECTION_NAME,
-                                embeddings=self.llm_service.embeddings,
-                            )
-                        return self._vectorstore
+        if self._vectorstore is None:
+            client = QdrantClient(
+                host=settings.QDRANT_HOST,
+                port=settings.QDRANT_PORT
+            )
+            self._vectorstore = Qdrant(
+                client=client,
+                collection_name=settings.COLLECTION_NAME,
+                embeddings=self.llm_service.embeddings,
+            )
+        return self._vectorstore
+
+    def _get_redis(self) -> redis.Redis:
+        """Client Redis (lazy) pour l'index documentaire."""
+        if self._redis is None:
+            self._redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis
+
+    def _write_doc_index(self, doc_id: str, path: Path, chunk_count: int) -> None:
+        """
+        Alimente l'index documentaire Redis lu par l'API documents
+        (hash doc:{id} + sorted set docs:by_indexed_at).
+        """
+        try:
+            r = self._get_redis()
+            pipe = r.pipeline(transaction=False)
+            pipe.hset(f"doc:{doc_id}", mapping={
+                "filename": path.name,
+                "source": "local",
+                "file_type": path.suffix.lower(),
+                "chunk_count": chunk_count,
+                "indexed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            })
+            pipe.zadd("docs:by_indexed_at", {doc_id: time.time()})
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Index documentaire Redis indisponible", error=str(e))
 
     def get_file_hash(self, filepath: str) -> str:
-              """Calcule le hash MD5 d'un fichier pour detecter les changements."""
+        """Calcule le hash MD5 d'un fichier pour detecter les changements."""
         with open(filepath, "rb") as f:
-                      return hashlib.md5(f.read()).hexdigest()
+            return hashlib.md5(f.read()).hexdigest()
 
     def is_already_indexed(self, filepath: str, file_hash: str) -> bool:
-              """Verifie si le fichier est deja indexe et inchange."""
+        """Verifie si le fichier est deja indexe et inchange."""
         cursor = self.db.execute(
-                      "SELECT file_hash, status FROM indexed_files WHERE filepath = ?",
-                      (filepath,)
+            "SELECT file_hash, status FROM indexed_files WHERE filepath = ?",
+            (filepath,)
         )
         row = cursor.fetchone()
         return row is not None and row[0] == file_hash and row[1] == "success"
 
     def detect_category(self, filename: str, content: str) -> str:
-              """Detection automatique de la categorie par mots-cles."""
+        """Detection automatique de la categorie par mots-cles."""
         text = (filename + " " + content[:500]).lower()
         for cat, keywords in CATEGORY_KEYWORDS.items():
-                      if any(kw in text for kw in keywords):
-                                        return cat
-                                return "general"
+            if any(kw in text for kw in keywords):
+                return cat
+        return "general"
 
     def detect_department(self, filepath: str) -> str:
-              """Detection du departement depuis le chemin du fichier."""
+        """Detection du departement depuis le chemin du fichier."""
         path_parts = Path(filepath).parts
         departments = ["rh", "finance", "juridique", "technique", "commercial", "direction"]
         for part in path_parts:
-                      for dept in departments:
-                                        if dept in part.lower():
-                                                              return dept
-                                                  return "general"
+            for dept in departments:
+                if dept in part.lower():
+                    return dept
+        return "general"
 
     def process_file(self, filepath: str) -> int:
-              """Traite un fichier et retourne le nombre de chunks indexes."""
+        """Traite un fichier et retourne le nombre de chunks indexes."""
         path = Path(filepath)
         if path.suffix.lower() not in SUPPORTED_FORMATS:
-                      return 0
+            return 0
 
         try:
-                      file_hash = self.get_file_hash(filepath)
-except Exception as e:
+            file_hash = self.get_file_hash(filepath)
+        except Exception as e:
             logger.error("Erreur lecture fichier", filepath=filepath, error=str(e))
             return 0
 
         if self.is_already_indexed(filepath, file_hash):
-                      logger.debug("Fichier deja indexe", filepath=path.name)
+            logger.debug("Fichier deja indexe", filepath=path.name)
             return 0
 
         logger.info("Traitement du fichier", filename=path.name)
 
         try:
-                      elements = partition(
-                                        filename=filepath,
-                                        strategy="hi_res",
-                                        infer_table_structure=True,
-                                        extract_images_in_pdf=False,
-                                        languages=["fra", "eng"]
-                      )
+            elements = partition(
+                filename=filepath,
+                strategy="hi_res",
+                infer_table_structure=True,
+                extract_images_in_pdf=False,
+                languages=["fra", "eng"]
+            )
 
             chunks = chunk_by_title(
-                              elements,
-                              max_characters=settings.CHUNK_SIZE,
-                              new_after_n_chars=800,
-                              overlap=settings.CHUNK_OVERLAP,
+                elements,
+                max_characters=settings.CHUNK_SIZE,
+                new_after_n_chars=800,
+                overlap=settings.CHUNK_OVERLAP,
             )
 
             texts = []
             metadatas = []
             for i, chunk in enumerate(chunks):
-                              text = str(chunk).strip()
+                text = str(chunk).strip()
                 if len(text) < 20:
-                                      continue
+                    continue
 
                 category = self.detect_category(path.name, text)
                 department = self.detect_department(filepath)
 
                 texts.append(text)
                 metadatas.append({
-                                      "source_file": path.name,
-                                      "source_path": str(filepath),
-                                      "file_type": path.suffix,
-                                      "chunk_index": i,
-                                      "category": category,
-                                      "department": department,
-                                      "file_hash": file_hash,
-                                      "doc_id": file_hash,
+                    "source_file": path.name,
+                    "source_path": str(filepath),
+                    "file_type": path.suffix,
+                    "chunk_index": i,
+                    "category": category,
+                    "department": department,
+                    "file_hash": file_hash,
+                    "doc_id": file_hash,
                 })
 
             if not texts:
-                              logger.warning("Aucun contenu extrait", filepath=path.name)
+                logger.warning("Aucun contenu extrait", filepath=path.name)
                 return 0
 
             self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
 
             self.db.execute("""
-                            INSERT OR REPLACE INTO indexed_files
-                                            (filepath, file_hash, indexed_at, chunk_count, status)
-                                                            VALUES (?, ?, CURRENT_TIMESTAMP, ?, 'success')
-                                                                        """, (str(filepath), file_hash, len(texts)))
+                INSERT OR REPLACE INTO indexed_files
+                    (filepath, file_hash, indexed_at, chunk_count, status)
+                VALUES (?, ?, CURRENT_TIMESTAMP, ?, 'success')
+            """, (str(filepath), file_hash, len(texts)))
             self.db.commit()
 
+            self._write_doc_index(file_hash, path, len(texts))
+
             logger.info("Fichier indexe", filename=path.name, chunks=len(texts))
             return len(texts)
 
-except Exception as e:
+        except Exception as e:
             logger.error("Erreur traitement", filepath=path.name, error=str(e))
             self.db.execute("""
-                            INSERT OR REPLACE INTO indexed_files
-                                            (filepath, file_hash, indexed_at, chunk_count, status, error_message)
-                                                            VALUES (?, ?, CURRENT_TIMESTAMP, 0, 'error', ?)
-                                                                        """, (str(filepath), file_hash, str(e)))
+                INSERT OR REPLACE INTO indexed_files
+                    (filepath, file_hash, indexed_at, chunk_count, status, error_message)
+                VALUES (?, ?, CURRENT_TIMESTAMP, 0, 'error', ?)
+            """, (str(filepath), file_hash, str(e)))
             self.db.commit()
             return 0
 
     def process_all(self, folder: str = None) -> dict:
-              """Lance l'ingestion complete d'un dossier."""
+        """Lance l'ingestion complete d'un dossier."""
         folder = folder or settings.DOCUMENTS_FOLDER
         folder_path = Path(folder)
 
         if not folder_path.exists():
-                      folder_path.mkdir(parents=True)
+            folder_path.mkdir(parents=True)
             logger.warning("Dossier cree", folder=str(folder_path))
             return {"total": 0, "indexed": 0, "skipped": 0, "errors": 0}
 
         all_files = []
         for fmt in SUPPORTED_FORMATS:
-                      all_files.extend(folder_path.rglob(f"*{fmt}"))
+            all_files.extend(folder_path.rglob(f"*{fmt}"))
 
         total = len(all_files)
         logger.info("Debut ingestion", total_files=total, folder=str(folder_path))
@@ -214,27 +244,27 @@ except Exception as e:
         errors = 0
 
         for filepath in tqdm(all_files, desc="Indexation"):
-                      try:
-                                        result = self.process_file(str(filepath))
+            try:
+                result = self.process_file(str(filepath))
                 if result > 0:
-                                      indexed += 1
-else:
+                    indexed += 1
+                else:
                     skipped += 1
-except Exception as e:
+            except Exception as e:
                 errors += 1
                 logger.error("Erreur inattendue", filepath=str(filepath), error=str(e))
 
         stats = {
-                      "total": total,
-                      "indexed": indexed,
-                      "skipped": skipped,
-                      "errors": errors,
+            "total": total,
+            "indexed": indexed,
+            "skipped": skipped,
+            "errors": errors,
         }
         logger.info("Ingestion terminee", **stats)
         return stats
 
     def watch(self, folder: str = None):
-              """Mode surveillance - indexe automatiquement les nouveaux fichiers."""
+        """Mode surveillance - indexe automatiquement les nouveaux fichiers."""
         folder = folder or settings.DOCUMENTS_FOLDER
         logger.info("Mode surveillance actif", folder=folder)
 
@@ -246,43 +276,43 @@ except Exception as e:
         observer.start()
 
         try:
-                      while True:
-                                        time.sleep(60)
-except KeyboardInterrupt:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
             observer.stop()
         observer.join()
 
     def get_stats(self) -> dict:
-              """Retourne les statistiques d'indexation."""
+        """Retourne les statistiques d'indexation."""
         cursor = self.db.execute("""
-                    SELECT status, COUNT(*), SUM(chunk_count)
-                                FROM indexed_files GROUP BY status
-                                        """)
+            SELECT status, COUNT(*), SUM(chunk_count)
+            FROM indexed_files GROUP BY status
+        """)
         stats = {}
         for row in cursor:
-                      stats[row[0]] = {"files": row[1], "chunks": row[2] or 0}
+            stats[row[0]] = {"files": row[1], "chunks": row[2] or 0}
         return stats
 
 
 class DocumentHandler(FileSystemEventHandler):
-      """Handler pour la surveillance du dossier de documents."""
+    """Handler pour la surveillance du dossier de documents."""
 
     def __init__(self, pipeline: IngestionPipeline):
-              self.pipeline = pipeline
+        self.pipeline = pipeline
 
     def on_created(self, event):
-              if not event.is_directory:
-                            logger.info("Nouveau document detecte", path=event.src_path)
+        if not event.is_directory:
+            logger.info("Nouveau document detecte", path=event.src_path)
             self.pipeline.process_file(event.src_path)
 
     def on_modified(self, event):
-              if not event.is_directory:
-                            logger.info("Document modifie detecte", path=event.src_path)
+        if not event.is_directory:
+            logger.info("Document modifie detecte", path=event.src_path)
             self.pipeline.process_file(event.src_path)
 
 
 if __name__ == "__main__":
-      import argparse
+    import argparse
     parser = argparse.ArgumentParser(description="Pipeline d'ingestion RAG")
     parser.add_argument("--folder", default=None, help="Dossier a indexer")
     parser.add_argument("--watch", action="store_true", help="Mode surveillance")
@@ -290,7 +320,7 @@ if __name__ == "__main__":
 
     pipeline = IngestionPipeline()
     if args.watch:
-              pipeline.watch(args.folder)
-else:
+        pipeline.watch(args.folder)
+    else:
         stats = pipeline.process_all(args.folder)
         print(f"Indexation terminee: {stats}")